@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Adaptive Steps
+Stops sampling once the denoised prediction stops changing, and calibrates the thresholds
+"""
+
+import time
+
+DEFAULT_THRESHOLDS = (0.005, 0.01, 0.02, 0.05)
+
+
+class ConvergenceStop(Exception):
+    """Raised from the sampler callback once the prediction has converged"""
+
+    def __init__(self, step, x0):
+        super().__init__(f"Converged at step {step}")
+        self.step = step
+        self.x0 = x0
+
+
+def relative_change(current, previous):
+    """||current - previous|| / ||current||, computed per run in float32"""
+    current = current.float()
+    return ((current - previous.float()).norm() / current.norm().clamp_min(1e-8)).item()
+
+
+def convergence_step(deltas, threshold, min_steps=8, patience=2):
+    """
+    First step at which sampling would stop for a threshold, or None.
+
+    deltas[i] is the change of the denoised prediction at step i against step
+    i - 1 (deltas[0] is None); stopping needs `patience` consecutive small changes.
+    """
+    calm = 0
+    for step, delta in enumerate(deltas):
+        if delta is None:
+            continue
+        calm = calm + 1 if delta < threshold else 0
+        if calm >= patience and step + 1 >= min_steps:
+            return step
+    return None
+
+
+class ConvergenceMonitor:
+    """
+    Tracks the per-step change of the sampler's denoised prediction (x0).
+
+    With a threshold it raises ConvergenceStop so the caller can decode the
+    current x0; with threshold=None it only records, which calibration uses.
+    """
+
+    def __init__(self, threshold=0.01, min_steps=8, patience=2, keep_predictions=False):
+        self.threshold = threshold
+        self.min_steps = min_steps
+        self.patience = patience
+        self.keep_predictions = keep_predictions
+        self.deltas = []
+        self.step_times = []
+        self.predictions = []
+        self.previous = None
+        self.last_time = None
+
+    def step_callback(self, step, x0, x, total_steps, preview=None):
+        now = time.perf_counter()
+        if self.last_time is not None:
+            self.step_times.append(now - self.last_time)
+        self.last_time = now
+
+        x0 = x0.detach()
+        delta = relative_change(x0, self.previous) if self.previous is not None else None
+        self.deltas.append(delta)
+        self.previous = x0.clone()
+        if self.keep_predictions:
+            self.predictions.append(x0.cpu().clone())
+
+        if self.threshold is not None and step + 1 < total_steps:
+            if convergence_step(self.deltas, self.threshold, self.min_steps, self.patience) == len(self.deltas) - 1:
+                raise ConvergenceStop(step, x0)
+
+
+def calibration_rows(monitor, sampler_name, scheduler_name, thresholds=DEFAULT_THRESHOLDS,
+                     min_steps=8, patience=2):
+    """
+    Quality/time tradeoff per threshold from one recorded full run.
+
+    Quality is the relative latent-space error of the early prediction against
+    the final one, a cheap proxy for how different the decoded image would be.
+    """
+    steps = len(monitor.deltas)
+    final = monitor.predictions[-1]
+    step_time = sum(monitor.step_times) / len(monitor.step_times) if monitor.step_times else 0.0
+
+    rows = []
+    for threshold in thresholds:
+        stop = convergence_step(monitor.deltas, threshold, min_steps, patience)
+        used = steps if stop is None else stop + 1
+        error = 0.0 if stop is None else relative_change(monitor.predictions[stop], final)
+        rows.append({
+            'sampler': sampler_name,
+            'scheduler': scheduler_name,
+            'threshold': threshold,
+            'steps_used': used,
+            'steps_total': steps,
+            'seconds_saved': (steps - used) * step_time,
+            'latent_error': error,
+        })
+    return rows
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Contact Sheets
+Lays results out along two sweep axes and streams the grid to a PNG in row bands
+"""
+
+import os
+import struct
+import textwrap
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+BACKGROUND = 255
+LABEL_COLOR = (0, 0, 0)
+
+
+def axis_value(result: Dict, axis: str) -> str:
+    """Read an axis value from a result; dotted names reach into nested dicts"""
+    value = result
+    for part in axis.split('.'):
+        if not isinstance(value, dict):
+            return 'None'
+        value = value.get(part)
+    if axis == 'loras':
+        value = ', '.join(f"{l['name']}:{l.get('weight', 1.0)}" for l in value or []) or 'None'
+    return str(value)
+
+
+def build_matrix(results: List[Dict], row_axis: str, col_axis: str):
+    """Return row labels, column labels, a {(row, col): result} map and the overflow count"""
+    rows, cols, cells = {}, {}, {}
+    skipped = 0
+    for result in results:
+        row = rows.setdefault(axis_value(result, row_axis), len(rows))
+        col = cols.setdefault(axis_value(result, col_axis), len(cols))
+        if (row, col) in cells:
+            skipped += 1
+            continue
+        cells[(row, col)] = result
+    return list(rows), list(cols), cells, skipped
+
+
+class PNGStreamWriter:
+    """Write an RGB PNG scanline band by band, so the full image never sits in memory"""
+
+    def __init__(self, path: Path, width: int, height: int, level: int = 6):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        self.width = width
+        self.rows_left = height
+        self.file = open(self.tmp_path, 'wb')
+        self.compressor = zlib.compressobj(level)
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write_rows(self, rows: np.ndarray):
+        """Append an (h, width, 3) uint8 band"""
+        height = rows.shape[0]
+        scanlines = np.zeros((height, 1 + self.width * 3), dtype=np.uint8)  # filter byte 0 = None
+        scanlines[:, 1:] = rows.reshape(height, -1)
+        data = self.compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_left -= height
+
+    def close(self):
+        if self.rows_left != 0:
+            raise ValueError(f"PNG stream is missing {self.rows_left} rows")
+        self._chunk(b'IDAT', self.compressor.flush())
+        self._chunk(b'IEND', b'')
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def _load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_label(text: str, width: int, height: int, font) -> np.ndarray:
+    """Render wrapped text into an (height, width, 3) uint8 array"""
+    image = Image.new('RGB', (width, height), (BACKGROUND,) * 3)
+    draw = ImageDraw.Draw(image)
+    chars_per_line = max(width // max(int(font.getlength('M')), 1), 4)
+    lines = textwrap.wrap(text, chars_per_line) or ['']
+    line_height = int(font.getbbox('Ag')[3]) + 4
+    max_lines = max(height // line_height, 1)
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        lines[-1] = lines[-1][:chars_per_line - 3] + '...'
+    draw.multiline_text((4, 4), '\n'.join(lines), fill=LABEL_COLOR, font=font, spacing=4)
+    return np.asarray(image)
+
+
+def load_thumbnail(path: Path, cell: int) -> Optional[np.ndarray]:
+    """Downscale an image to fit a cell, returned as an RGB uint8 array"""
+    try:
+        with Image.open(path) as image:
+            image.draft('RGB', (cell, cell))
+            image = image.convert('RGB')
+            image.thumbnail((cell, cell), Image.BILINEAR)
+            return np.asarray(image)
+    except (OSError, ValueError):
+        return None
+
+
+def render_grid(rows: List[str], cols: List[str], cells: Dict[Tuple[int, int], Dict],
+                output_path: Path, cell: int = 256, label_width: int = 240, header_height: int = 48,
+                padding: int = 4, band_bytes: int = 64 * 1024 ** 2, workers: int = 8):
+    """
+    Compose a labeled contact sheet and stream it to `output_path`.
+
+    Each band of grid rows is one preallocated canvas that thumbnails are
+    written into directly; bands are flushed to the PNG as soon as they fill.
+    """
+    pitch = cell + padding
+    width = label_width + len(cols) * pitch
+    height = header_height + len(rows) * pitch
+    font = _load_font(14)
+
+    rows_per_band = max(band_bytes // (pitch * width * 3), 1)
+
+    with PNGStreamWriter(output_path, width, height) as writer, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        header = np.full((header_height, width, 3), BACKGROUND, dtype=np.uint8)
+        for c, label in enumerate(cols):
+            x = label_width + c * pitch
+            header[:, x:x + cell] = render_label(label, cell, header_height, font)
+        writer.write_rows(header)
+
+        for band_start in range(0, len(rows), rows_per_band):
+            band_rows = range(band_start, min(band_start + rows_per_band, len(rows)))
+            canvas = np.full((len(band_rows) * pitch, width, 3), BACKGROUND, dtype=np.uint8)
+
+            keys = [(r, c) for r in band_rows for c in range(len(cols)) if (r, c) in cells]
+            thumbs = executor.map(lambda key: load_thumbnail(cells[key]['full_path'], cell), keys)
+
+            for r in band_rows:
+                y = (r - band_start) * pitch
+                canvas[y:y + cell, :label_width] = render_label(rows[r], label_width, cell, font)
+
+            for (r, c), thumb in zip(keys, thumbs):
+                if thumb is None:
+                    continue
+                h, w = thumb.shape[:2]
+                y = (r - band_start) * pitch + (cell - h) // 2
+                x = label_width + c * pitch + (cell - w) // 2
+                canvas[y:y + h, x:x + w] = thumb
+
+            writer.write_rows(canvas)
+
+    return width, height
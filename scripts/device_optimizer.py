@@ -129,7 +129,11 @@ def create_device_config(device_info):
             "default_steps": 30 if device_info["device"] != "cpu" else 20,
             "default_guidance_scale": 7.5,
             "scheduler": "dpm_2m_karras" if device_info["device"] != "cpu" else "euler_a",
-            "enable_vae_tiling": device_info["memory_gb"] < 8,
+            # Tiled decode keeps full-resolution output within bounded memory on CPU
+            "enable_vae_tiling": device_info["memory_gb"] < 8 or device_info["device"] == "cpu",
+            "vae_tile_size": 512,
+            "vae_tile_overlap": 64,
+            "vae_tile_workers": 1,
             "enable_cpu_offload": "cpu_offload" in device_info["optimizations"]
         },
         "model_settings": {
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Model Downloader
+Parallel, resumable, checksum-verified downloads driven by the model JSON configs
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / 'configs'
+MODEL_SETS = {
+    'essentials': 'models_essential.json',
+    'recommended': 'models_recommended.json',
+}
+CATEGORY_DIRS = {
+    'base': 'checkpoints',
+    'refiner': 'checkpoints',
+    'lora': 'loras',
+    'vae': 'vae',
+}
+
+READ_SIZE = 256 * 1024
+HF_RESOLVE_URL = re.compile(r'https://huggingface\.co/(?P<repo>[^/]+/[^/]+)/resolve/(?P<revision>[^/]+)/(?P<path>.+)')
+USER_AGENT = 'AutoFooocus-Downloader/1.0'
+
+
+class ChecksumError(Exception):
+    """Downloaded file does not match its expected SHA-256"""
+
+
+def parse_rate(value):
+    """Parse a bandwidth cap like '20M', '500K' or '1048576' into bytes/second"""
+    if not value:
+        return None
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([KMG]?)B?', str(value).strip().upper())
+    if not match:
+        raise ValueError(f"Invalid rate limit: {value}")
+    number, unit = match.groups()
+    return int(float(number) * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit])
+
+
+def format_size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def sha256_file(path, hasher=None):
+    hasher = hasher or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher
+
+
+class RateLimiter:
+    """Token bucket shared by all download threads"""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, num_bytes):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.allowance = min(self.allowance + (now - self.last) * self.rate, self.rate)
+            self.last = now
+            self.allowance -= num_bytes
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def advertised_sha256(url, timeout=30):
+    """
+    SHA-256 the server publishes for a file, if any.
+
+    Hugging Face answers /resolve/ URLs for LFS files with a redirect that
+    carries the content hash in X-Linked-Etag.
+    """
+    opener = urllib.request.build_opener(_NoRedirect)
+    request = urllib.request.Request(url, method='HEAD', headers={'User-Agent': USER_AGENT})
+    try:
+        with opener.open(request, timeout=timeout) as response:
+            headers = response.headers
+    except urllib.error.HTTPError as e:
+        headers = e.headers
+    except (urllib.error.URLError, OSError):
+        return None
+    etag = (headers.get('X-Linked-Etag') or '').strip().strip('"')
+    return etag.lower() if re.fullmatch(r'[0-9a-fA-F]{64}', etag) else None
+
+
+def published_sha256(url, timeout=30):
+    """
+    SHA-256 the Hugging Face Hub lists for a file in its repository tree.
+
+    This is the LFS object id recorded when the file was uploaded, so pinning
+    it does not depend on the bytes this machine happened to download.
+    """
+    match = HF_RESOLVE_URL.match(url)
+    if not match:
+        return None
+    folder = match['path'].rpartition('/')[0]
+    api_url = f"https://huggingface.co/api/models/{match['repo']}/tree/{match['revision']}"
+    if folder:
+        api_url += f"/{folder}"
+
+    request = urllib.request.Request(api_url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            entries = json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+    for entry in entries:
+        if entry.get('path') == match['path'] and entry.get('lfs'):
+            oid = str(entry['lfs'].get('oid', ''))
+            return oid.lower() if re.fullmatch(r'[0-9a-fA-F]{64}', oid) else None
+    return None
+
+
+class DownloadManager:
+    """Downloads files concurrently, resuming partial files with HTTP Range requests"""
+
+    def __init__(self, workers=3, rate_limit=None, retries=5, timeout=60, verify_server_hash=True):
+        self.workers = workers
+        self.limiter = RateLimiter(parse_rate(rate_limit))
+        self.retries = retries
+        self.timeout = timeout
+        self.verify_server_hash = verify_server_hash
+        self.print_lock = threading.Lock()
+
+    def log(self, message):
+        with self.print_lock:
+            print(message, flush=True)
+
+    def download(self, url, path, sha256=None):
+        """Download url to path; a `.part` file holds progress between attempts and runs"""
+        path = Path(path)
+        if path.exists():
+            if sha256:
+                self.verify_existing(path, sha256.lower())
+                self.log(f"   ✓ {path.name} already exists, checksum verified")
+            else:
+                self.log(f"   ✓ {path.name} already exists, skipping")
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = path.with_name(path.name + '.part')
+        expected = (sha256 or '').lower() or (advertised_sha256(url) if self.verify_server_hash else None)
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                hasher = self._fetch(url, part_path)
+                break
+            except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code != 429:
+                    raise
+                if attempt == self.retries:
+                    raise
+                delay = min(2 ** attempt, 60)
+                self.log(f"   ⚠ {path.name}: {e}; resuming in {delay}s (attempt {attempt}/{self.retries})")
+                time.sleep(delay)
+
+        if expected:
+            actual = hasher.hexdigest()
+            if actual != expected:
+                part_path.unlink()
+                raise ChecksumError(f"{path.name}: SHA-256 {actual} does not match expected {expected}")
+            self.log(f"   ✓ {path.name} checksum verified")
+        else:
+            self.log(f"   ⚠ {path.name}: no checksum available, not verified")
+
+        os.replace(part_path, path)
+        if expected:
+            self._mark_verified(path, expected)
+        return path
+
+    @staticmethod
+    def _verified_marker(path):
+        return path.with_name(f".{path.name}.sha256")
+
+    def _mark_verified(self, path, sha256):
+        stat = path.stat()
+        self._verified_marker(path).write_text(f"{sha256} {stat.st_size} {stat.st_mtime_ns}\n")
+
+    def verify_existing(self, path, sha256):
+        """Check an existing file against its expected SHA-256; the result is cached until the file changes"""
+        stat = path.stat()
+        marker = self._verified_marker(path)
+        if marker.exists() and marker.read_text().strip() == f"{sha256} {stat.st_size} {stat.st_mtime_ns}":
+            return
+        self.log(f"   🔍 Verifying existing {path.name}...")
+        actual = sha256_file(path).hexdigest()
+        if actual != sha256:
+            raise ChecksumError(f"{path.name}: existing file has SHA-256 {actual}, expected {sha256}; "
+                                f"delete it to download again")
+        self._mark_verified(path, sha256)
+
+    def _fetch(self, url, part_path):
+        """Append the rest of url to part_path, returning a SHA-256 of the whole file"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {'User-Agent': USER_AGENT}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:  # nothing left to fetch
+                return sha256_file(part_path)
+            raise
+
+        with response:
+            if offset and response.status != 206:
+                self.log(f"   ⚠ {part_path.stem}: server ignored Range, restarting from zero")
+                offset = 0
+            hasher = sha256_file(part_path) if offset else hashlib.sha256()
+
+            length = response.headers.get('Content-Length')
+            total = offset + int(length) if length else None
+            done = offset
+            next_report = 0.1
+            if offset:
+                self.log(f"   ↻ {part_path.stem}: resuming at {format_size(offset)}")
+
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                while True:
+                    block = response.read(READ_SIZE)
+                    if not block:
+                        break
+                    self.limiter.consume(len(block))
+                    f.write(block)
+                    hasher.update(block)
+                    done += len(block)
+                    if total and done / total >= next_report:
+                        self.log(f"   {part_path.stem}: {done / total:.0%} of {format_size(total)}")
+                        next_report += 0.1
+
+            if total and done < total:
+                raise ConnectionError(f"connection closed at {format_size(done)} of {format_size(total)}")
+        return hasher
+
+    def download_all(self, items):
+        """Download dicts with url, path and optional sha256; returns [(item, error)] for failures"""
+        def run(item):
+            exists = Path(item['path']).exists()
+            if exists and not item.get('sha256'):
+                return None
+            if not exists:
+                self.log(f"\n📥 Downloading: {Path(item['path']).name}")
+                if item.get('description'):
+                    self.log(f"   Description: {item['description']}")
+                if item.get('size'):
+                    self.log(f"   Expected size: {item['size']}")
+            try:
+                self.download(item['url'], item['path'], item.get('sha256'))
+                return None
+            except Exception as e:
+                self.log(f"   ✗ {Path(item['path']).name} failed: {e}")
+                return item, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return [failure for failure in executor.map(run, items) if failure]
+
+
+def load_model_set(config_path, models_dir, category=None, names=None):
+    """Expand a models_*.json config into download items"""
+    with open(config_path, 'r') as f:
+        data = json.load(f)
+
+    items = []
+    for model_category, models in data['models'].items():
+        if category and model_category != category:
+            continue
+        for model in models:
+            if names and not any(name.lower() in model['file'].lower() for name in names):
+                continue
+            item = dict(model)
+            item['path'] = Path(models_dir) / CATEGORY_DIRS[model_category] / model['file']
+            items.append(item)
+    return items
+
+
+def pin_checksums(config_path):
+    """Record the published SHA-256 of every model in the config; returns models left unpinned"""
+    with open(config_path, 'r') as f:
+        data = json.load(f)
+
+    unresolved = []
+    for models in data['models'].values():
+        for model in models:
+            if model.get('sha256'):
+                continue
+            sha256 = published_sha256(model['url'])
+            if sha256:
+                model['sha256'] = sha256
+                print(f"Pinned {model['file']}: {sha256}")
+            else:
+                unresolved.append(model['file'])
+                print(f"⚠ No published SHA-256 found for {model['file']}")
+
+    tmp_path = Path(str(config_path) + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, config_path)
+    return unresolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download AutoFooocus models')
+    parser.add_argument('set', nargs='?', default='essentials', choices=sorted(MODEL_SETS),
+                        help='Model set to download')
+    parser.add_argument('--config', type=str, help='Model config JSON (overrides the model set)')
+    parser.add_argument('--category', choices=sorted(CATEGORY_DIRS), help='Only download one category')
+    parser.add_argument('--models', nargs='+', help='Only download models whose file name contains these')
+    parser.add_argument('--models-dir', type=str, default='models', help='Fooocus models directory')
+    parser.add_argument('--workers', type=int, default=3, help='Concurrent downloads')
+    parser.add_argument('--limit-rate', type=str, help='Total bandwidth cap, e.g. 20M or 500K (bytes/s)')
+    parser.add_argument('--retries', type=int, default=5, help='Attempts per file before giving up')
+    parser.add_argument('--pin', action='store_true', help='Write the published SHA-256 of each model into the config')
+
+    args = parser.parse_args()
+    config_path = Path(args.config) if args.config else CONFIG_DIR / MODEL_SETS[args.set]
+
+    if args.pin:
+        if pin_checksums(config_path):
+            sys.exit(1)
+        return
+
+    items = load_model_set(config_path, args.models_dir, args.category, args.models)
+    if not items:
+        print("No models match the selection")
+        return
+
+    manager = DownloadManager(workers=args.workers, rate_limit=args.limit_rate, retries=args.retries)
+    failures = manager.download_all(items)
+
+    if failures:
+        print(f"\n✗ {len(failures)} of {len(items)} downloads failed:")
+        for item, error in failures:
+            print(f"  {Path(item['path']).name}: {error}")
+        sys.exit(1)
+
+    print(f"\n✓ {len(items)} models ready")
+
+
+if __name__ == '__main__':
+    main()
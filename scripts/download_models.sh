@@ -2,6 +2,7 @@
 
 # AutoFooocus Model Downloader
 # Downloads common SDXL base models and LoRAs from Hugging Face
+# (model lists live in configs/models_*.json; downloads run through download_models.py)
 
 set -e
 
@@ -21,100 +22,33 @@ VAE_DIR="$MODELS_DIR/vae"
 # Create model directories
 mkdir -p "$CHECKPOINTS_DIR" "$LORAS_DIR" "$VAE_DIR"
 
-# Function to download file with progress
-download_file() {
-    local url="$1"
-    local output_file="$2"
-    local description="$3"
-    local size="$4"
-    
-    echo -e "\n📥 Downloading: $(basename "$output_file")"
-    echo "   Description: $description"
-    echo "   Expected size: $size"
-    
-    if [ -f "$output_file" ]; then
-        echo "   ✓ Already exists, skipping..."
-        return 0
-    fi
+# Python download manager: parallel, resumable (HTTP Range), SHA-256 verified
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PYTHON="${PYTHON:-python3}"
+
+# Download a model set listed in configs/models_<set>.json
+# Extra options are passed through, e.g. DOWNLOAD_OPTS="--workers 4 --limit-rate 50M"
+download_set() {
+    local model_set="$1"
     
-    if curl -L --progress-bar -o "$output_file.tmp" "$url"; then
-        mv "$output_file.tmp" "$output_file"
-        echo "   ✓ Downloaded successfully!"
-        return 0
-    else
-        echo "   ✗ Download failed"
-        rm -f "$output_file.tmp"
-        return 1
-    fi
+    # shellcheck disable=SC2086
+    "$PYTHON" "$SCRIPT_DIR/download_models.py" "$model_set" --models-dir "$MODELS_DIR" $DOWNLOAD_OPTS
 }
 
 # Function to download essential models
 download_essentials() {
     echo -e "${YELLOW}Downloading essential models...${NC}"
     
-    # SDXL Base
-    download_file \
-        "https://huggingface.co/stabilityai/stable-diffusion-xl-base-1.0/resolve/main/sd_xl_base_1.0.safetensors" \
-        "$CHECKPOINTS_DIR/sd_xl_base_1.0.safetensors" \
-        "Official Stable Diffusion XL base model" \
-        "6.94 GB"
-    
-    # SDXL Refiner
-    download_file \
-        "https://huggingface.co/stabilityai/stable-diffusion-xl-refiner-1.0/resolve/main/sd_xl_refiner_1.0.safetensors" \
-        "$CHECKPOINTS_DIR/sd_xl_refiner_1.0.safetensors" \
-        "Official SDXL refiner model" \
-        "6.08 GB"
-    
-    # Official LoRA
-    download_file \
-        "https://huggingface.co/stabilityai/stable-diffusion-xl-base-1.0/resolve/main/sd_xl_offset_example-lora_1.0.safetensors" \
-        "$LORAS_DIR/sd_xl_offset_example-lora_1.0.safetensors" \
-        "Official offset LoRA example" \
-        "49.6 MB"
-    
-    # SDXL VAE
-    download_file \
-        "https://huggingface.co/stabilityai/sdxl-vae/resolve/main/sdxl_vae.safetensors" \
-        "$VAE_DIR/sdxl_vae.safetensors" \
-        "Official SDXL VAE" \
-        "334.6 MB"
+    download_set essentials
     
     echo -e "${GREEN}✓ Essential models downloaded${NC}"
 }
 
-# Function to download recommended models
+# Function to download recommended models (includes the essentials)
 download_recommended() {
     echo -e "${YELLOW}Downloading recommended models...${NC}"
     
-    # Call essentials first
-    download_essentials
-    
-    # Additional base models
-    download_file \
-        "https://huggingface.co/RunDiffusion/Juggernaut-XL-v9/resolve/main/Juggernaut-XL_v9_RunDiffusionPhoto_v2.safetensors" \
-        "$CHECKPOINTS_DIR/juggernautXL_v9.safetensors" \
-        "Popular photorealistic model" \
-        "6.62 GB"
-    
-    download_file \
-        "https://huggingface.co/SG161222/RealVisXL_V4.0/resolve/main/RealVisXL_V4.0.safetensors" \
-        "$CHECKPOINTS_DIR/realvisxlV40.safetensors" \
-        "Photorealistic model" \
-        "6.94 GB"
-    
-    # Additional LoRAs
-    download_file \
-        "https://huggingface.co/nerijs/pixel-art-xl/resolve/main/pixel-art-xl.safetensors" \
-        "$LORAS_DIR/pixel-art-xl.safetensors" \
-        "Pixel art style" \
-        "49.6 MB"
-    
-    download_file \
-        "https://huggingface.co/ostris/watercolor_style_lora_sdxl/resolve/main/watercolor_v1_sdxl.safetensors" \
-        "$LORAS_DIR/watercolor_v1_sdxl.safetensors" \
-        "Watercolor painting style" \
-        "49.6 MB"
+    download_set recommended
     
     echo -e "${GREEN}✓ Recommended models downloaded${NC}"
 }
@@ -178,6 +112,9 @@ show_help() {
     echo "  list           List downloaded models"
     echo "  help           Show this help"
     echo ""
+    echo "Environment:"
+    echo "  DOWNLOAD_OPTS  Extra downloader options, e.g. \"--workers 4 --limit-rate 50M\""
+    echo ""
     echo "Examples:"
     echo "  $0 essentials"
     echo "  $0 recommended"
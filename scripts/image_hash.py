@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Perceptual Hashing
+pHash/dHash image fingerprints and vectorized near-duplicate clustering
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+HASH_TYPES = ('phash', 'dhash')
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2D DCT is D @ X @ D.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _pack_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack (N, 64) boolean arrays into N uint64 hashes"""
+    return np.packbits(bits.astype(np.uint8), axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def _load_gray(path, size):
+    """Load an image as a small grayscale float array"""
+    with Image.open(path) as image:
+        image.draft('L', (size[0] * 4, size[1] * 4))
+        return np.asarray(image.convert('L').resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def phash_arrays(gray: np.ndarray) -> np.ndarray:
+    """pHash of a (N, 32, 32) grayscale stack: low-frequency DCT signs vs. median"""
+    coeffs = _DCT_32 @ gray @ _DCT_32.T
+    low = coeffs[:, :8, :8].reshape(len(gray), 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack_bits(low > median)
+
+
+def dhash_arrays(gray: np.ndarray) -> np.ndarray:
+    """dHash of a (N, 8, 9) grayscale stack: horizontal gradient signs"""
+    return _pack_bits((gray[:, :, 1:] > gray[:, :, :-1]).reshape(len(gray), 64))
+
+
+def compute_hashes(paths: List, workers: int = 8) -> Dict[str, np.ndarray]:
+    """
+    Compute pHash and dHash for every path; image loading runs in threads.
+
+    Truncated or unreadable images are marked False in 'valid' and get a
+    zero hash, so one bad file does not abort the whole run.
+    """
+    def load(path):
+        try:
+            return _load_gray(path, (32, 32)), _load_gray(path, (9, 8))
+        except (OSError, ValueError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = list(executor.map(load, paths))
+
+    valid = np.array([item is not None for item in loaded], dtype=bool)
+    result = {
+        'phash': np.zeros(len(loaded), dtype=np.uint64),
+        'dhash': np.zeros(len(loaded), dtype=np.uint64),
+        'valid': valid,
+    }
+    if valid.any():
+        result['phash'][valid] = phash_arrays(np.stack([item[0] for item in loaded if item is not None]))
+        result['dhash'][valid] = dhash_arrays(np.stack([item[1] for item in loaded if item is not None]))
+    return result
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Element-wise Hamming distance between uint64 hash arrays"""
+    x = np.ascontiguousarray(np.bitwise_xor(a, b), dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(x).astype(np.uint8)
+    return _POPCOUNT_TABLE[x.view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def _compress(labels: np.ndarray) -> None:
+    """Point every entry straight at its set's root by pointer doubling"""
+    while True:
+        parents = labels[labels]
+        if np.array_equal(parents, labels):
+            return
+        labels[:] = parents
+
+
+def _union(labels: np.ndarray, a: np.ndarray, b: np.ndarray) -> None:
+    """Merge the sets of a[i] and b[i] in place; every set is labelled by its smallest index"""
+    while True:
+        _compress(labels)
+        root_a, root_b = labels[a], labels[b]
+        differ = root_a != root_b
+        if not differ.any():
+            return
+        a, b = root_a[differ], root_b[differ]
+        np.minimum.at(labels, np.maximum(a, b), np.minimum(a, b))
+
+
+def _cluster_labels(hashes: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Label hashes connected by chains of pairs within `threshold` bits.
+
+    By the pigeonhole principle, two hashes differing in at most `threshold`
+    bits agree exactly on at least one of `threshold + 1` disjoint bit bands,
+    so only pairs sharing a band value are candidates. Within a band bucket,
+    members already in the same set are sorted next to each other and never
+    compared, and close pairs are merged as they are found; a large cluster
+    therefore collapses into one run instead of costing O(m^2) comparisons.
+    """
+    count = len(hashes)
+    labels = np.arange(count)
+    bounds = np.linspace(0, 64, threshold + 2).astype(int)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(hi - lo)) - 1)
+        keys = (hashes >> np.uint64(lo)) & mask
+        active = np.arange(count)
+
+        while len(active) > 1:
+            # Sort by band value, then by set, so each (bucket, set) is one contiguous run
+            order = active[np.lexsort((labels[active], keys[active]))]
+            sorted_keys = keys[order]
+            sorted_labels = labels[order]
+            new_bucket = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+            new_run = new_bucket | np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]
+
+            # Only buckets holding more than one set have anything left to compare
+            bucket_id = np.cumsum(new_bucket) - 1
+            multi = (np.bincount(bucket_id, weights=new_run) > 1)[bucket_id]
+            order, sorted_keys, new_run = order[multi], sorted_keys[multi], new_run[multi]
+            if not len(order):
+                break
+
+            run_starts = np.flatnonzero(new_run)
+            run_end = np.r_[run_starts[1:], len(order)][np.cumsum(new_run) - 1]
+            # A trailing sentinel that matches no band value ends every walk at the last bucket
+            sorted_keys = np.r_[sorted_keys, np.uint64(0xFFFFFFFFFFFFFFFF)]
+            sorted_hashes = hashes[order]
+
+            # Pair each position with the positions after its own run, one offset at a time
+            alive = np.arange(len(order))
+            partner = run_end
+            merged = resort = False
+            while True:
+                same_bucket = sorted_keys[partner] == sorted_keys[alive]
+                alive, partner = alive[same_bucket], partner[same_bucket]
+                if not len(alive):
+                    break
+
+                # Until something merges, runs are distinct sets, so every pair crosses sets
+                compare = slice(None)
+                if merged:
+                    compare = labels[order[alive]] != labels[order[partner]]
+                    if compare.sum() * 2 < len(alive):
+                        # Most pairs now fall inside merged sets: re-sort so they stop being walked
+                        resort = True
+                        break
+                a, b = alive[compare], partner[compare]
+                close = hamming(sorted_hashes[a], sorted_hashes[b]) <= threshold
+                if close.any():
+                    _union(labels, order[a[close]], order[b[close]])
+                    merged = True
+                partner = partner + 1
+
+            if not resort:
+                break
+            active = order
+
+    _compress(labels)
+    return labels
+
+
+def cluster_hashes(hashes: np.ndarray, threshold: int = 6) -> List[List[int]]:
+    """
+    Group indices whose hashes are within `threshold` bits of each other.
+
+    Returns clusters with more than one member, largest first; each cluster
+    is sorted so its first index can serve as the representative.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(hashes) == 0:
+        return []
+
+    # Identical hashes collapse up front, so huge exact-duplicate groups stay cheap
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    inverse = inverse.ravel()
+    if threshold > 0 and len(unique) > 1:
+        components = _cluster_labels(unique, threshold)
+    else:
+        components = np.arange(len(unique))
+    labels = components[inverse]
+
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    clusters = [group.tolist() for group in np.split(order, boundaries) if len(group) > 1]
+    clusters.sort(key=lambda group: (-len(group), group[0]))
+    return clusters
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Job Control
+Per-job/per-batch wall-clock budgets and cooperative cancellation of sampling
+"""
+
+import signal
+import time
+
+# Send this signal to the batch process to abandon the current job and continue
+CANCEL_SIGNAL = getattr(signal, 'SIGUSR1', None)
+
+
+class JobCancelled(Exception):
+    """Raised from the sampler callback to abandon the current job"""
+    status = 'cancelled'
+
+
+class JobTimedOut(JobCancelled):
+    """The job ran past its wall-clock budget"""
+    status = 'timeout'
+
+
+class BatchTimedOut(JobTimedOut):
+    """The batch ran past its wall-clock budget"""
+    status = 'timeout'
+
+
+class JobController:
+    """
+    Tracks time budgets for the batch and the job in flight.
+
+    check() is called from the sampler step callback, before and after each
+    pipeline stage and between tiles of a threaded VAE decode, so a runaway job
+    stops at the next check instead of blocking the batch.
+    """
+
+    def __init__(self, job_timeout=None, batch_timeout=None):
+        self.job_timeout = job_timeout
+        self.batch_timeout = batch_timeout
+        self.batch_deadline = None
+        self.job_deadline = None
+        self.job_budget = None
+        self.cancel_requested = False
+
+    def install_signal_handler(self):
+        """Cancel the current job on SIGUSR1 (POSIX only)"""
+        if CANCEL_SIGNAL is None:
+            return
+
+        def handle(signum, frame):
+            print("\n⏹  Cancel requested, stopping current job at the next step...")
+            self.cancel_requested = True
+
+        signal.signal(CANCEL_SIGNAL, handle)
+
+    def start_batch(self):
+        if self.batch_timeout:
+            self.batch_deadline = time.monotonic() + self.batch_timeout
+
+    def start_job(self, jobs=1):
+        """Start the job budget; a pack of `jobs` prompts sampled together gets `jobs` budgets"""
+        self.cancel_requested = False
+        self.job_budget = self.job_timeout * jobs if self.job_timeout else None
+        self.job_deadline = time.monotonic() + self.job_budget if self.job_budget else None
+
+    def batch_expired(self):
+        return self.batch_deadline is not None and time.monotonic() > self.batch_deadline
+
+    def check(self):
+        """Raise if the current job should stop"""
+        now = time.monotonic()
+        if self.cancel_requested:
+            self.cancel_requested = False
+            raise JobCancelled("Job cancelled by signal")
+        if self.job_deadline is not None and now > self.job_deadline:
+            raise JobTimedOut(f"Job exceeded its {self.job_budget:.0f}s budget")
+        if self.batch_deadline is not None and now > self.batch_deadline:
+            raise BatchTimedOut(f"Batch exceeded its {self.batch_timeout:.0f}s budget")
+
+    def step_callback(self, step, x0, x, total_steps, preview=None):
+        """Signature-compatible with modules.core.ksampler's callback_function"""
+        self.check()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Latent Checkpointing
+Snapshots in-progress sampling every K steps so preempted jobs resume where they stopped
+"""
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+
+# Samplers whose only state between steps is the latent and the global RNG.
+# Multistep (dpmpp_2m, lms) and Brownian-tree SDE samplers keep history that
+# lives inside k-diffusion, so they cannot be resumed bit-identically.
+RESUMABLE_SAMPLERS = {'euler', 'euler_a', 'euler_ancestral', 'heun', 'dpm_2', 'dpm_2_ancestral'}
+
+SNAPSHOT_VERSION = 1
+
+
+def get_rng_state():
+    """Capture every RNG that the sampler's noise can be drawn from"""
+    state = {'cpu': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    if hasattr(torch, 'mps') and hasattr(torch.mps, 'get_rng_state') and torch.backends.mps.is_available():
+        state['mps'] = torch.mps.get_rng_state()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state['cpu'])
+    if 'cuda' in state:
+        torch.cuda.set_rng_state_all(state['cuda'])
+    if 'mps' in state:
+        torch.mps.set_rng_state(state['mps'])
+
+
+@contextmanager
+def raw_latent_input(unet):
+    """
+    Feed a snapshot latent to the sampler exactly as captured.
+
+    Snapshots hold the sampler's internal (already scaled) latent; scaling it
+    out and back in would not round-trip bit-exactly, so skip process_latent_in.
+    """
+    model = unet.model
+    model.process_latent_in = lambda latent: latent
+    try:
+        yield
+    finally:
+        del model.process_latent_in
+
+
+class LatentCheckpointer:
+    """Writes, loads and garbage-collects per-job sampling snapshots and completion records"""
+
+    def __init__(self, checkpoint_dir, every):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.every = every
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        for stale in self.checkpoint_dir.glob('*.tmp'):
+            stale.unlink()
+
+    @staticmethod
+    def supports(sampler_name):
+        return sampler_name in RESUMABLE_SAMPLERS
+
+    @staticmethod
+    def job_key(**params):
+        """Stable key for a job, so a restarted batch finds its snapshot"""
+        payload = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def path(self, key):
+        return self.checkpoint_dir / f"{key}.pt"
+
+    def load(self, key):
+        path = self.path(key)
+        if not path.exists():
+            return None
+        snapshot = torch.load(path, map_location='cpu')
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    def save(self, key, snapshot):
+        """Write atomically: a crash mid-write leaves the previous snapshot intact"""
+        path = self.path(key)
+        tmp_path = path.with_suffix('.pt.tmp')
+        with open(tmp_path, 'wb') as f:
+            torch.save(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def discard(self, key):
+        path = self.path(key)
+        if path.exists():
+            path.unlink()
+
+    def completed_path(self, key):
+        return self.checkpoint_dir / f"{key}.done.json"
+
+    def completed(self, key):
+        """Record of a job an earlier run already finished, or None"""
+        path = self.completed_path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def mark_completed(self, key, record):
+        """Remember a finished job so a rerun of the batch skips it"""
+        path = self.completed_path(key)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def finish_plan(self, keys):
+        """Forget a fully finished plan, so running it again generates new images"""
+        for key in keys:
+            self.discard(key)
+            path = self.completed_path(key)
+            if path.exists():
+                path.unlink()
+
+    def prune(self, keys):
+        """Delete snapshots and completion records of jobs that are not in the current plan"""
+        keys = set(keys)
+        removed = 0
+        for path in list(self.checkpoint_dir.glob('*.pt')) + list(self.checkpoint_dir.glob('*.done.json')):
+            if path.name.split('.')[0] not in keys:
+                path.unlink()
+                removed += 1
+        if removed:
+            print(f"🧹 Removed {removed} checkpoint file(s) from jobs no longer in the plan")
+
+    def step_callback(self, key, seed, start_step=0):
+        """ksampler callback that snapshots the state at the start of every Kth step"""
+        def callback(step, x0, x, total_steps, preview=None):
+            # At this point step `step` has evaluated the model but not yet moved x
+            # or drawn its noise, so (x, RNG) is exactly the input state of the step.
+            if step > start_step and step % self.every == 0:
+                self.save(key, {
+                    'version': SNAPSHOT_VERSION,
+                    'step': step,
+                    'seed': seed,
+                    'latent': x.detach().cpu().clone(),
+                    'rng': get_rng_state(),
+                })
+                print(f"💾 Checkpoint at step {step}/{total_steps}")
+        return callback
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Profiling Hooks
+Per-stage timing for every job, plus cProfile/torch.profiler traces for sampled jobs
+"""
+
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+
+STAGES = ('clip_encode', 'ksampler', 'decode_vae', 'save')
+
+
+@contextmanager
+def stage(name, job_stats=None):
+    """
+    Annotate a pipeline stage.
+
+    The stage always shows up as a named range in an active torch.profiler
+    trace; its wall time is added to job_stats['stage_seconds'] when given.
+    """
+    start = time.perf_counter()
+    with torch.profiler.record_function(name):
+        yield
+    if job_stats is not None:
+        stage_seconds = job_stats.setdefault('stage_seconds', {})
+        stage_seconds[name] = stage_seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+class JobProfiler:
+    """Profile selected jobs (explicit indices and/or every Nth) into a profiles/ folder"""
+
+    def __init__(self, output_dir, every=0, jobs=None, top_n=25):
+        self.output_dir = Path(output_dir) / 'profiles'
+        self.every = every
+        self.jobs = set(jobs or [])
+        self.top_n = top_n
+
+    def should_profile(self, job_index):
+        if job_index in self.jobs:
+            return True
+        return self.every > 0 and (job_index - 1) % self.every == 0
+
+    @contextmanager
+    def profile_job(self, job_index):
+        """
+        Wrap one job, or a packed sampler call given the list of its job numbers.
+
+        A no-op unless one of the jobs is selected for profiling; reports are
+        named after all job numbers, e.g. job_003_007 for a pack of jobs 3 and 7.
+        """
+        indices = list(job_index) if isinstance(job_index, (list, tuple)) else [job_index]
+        if not any(self.should_profile(index) for index in indices):
+            yield None
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        label = ', '.join(str(index) for index in indices)
+        prefix = self.output_dir / ('job_' + '_'.join(f"{index:03d}" for index in indices))
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+        print(f"🔬 Profiling job {label}")
+        cpu_profiler = cProfile.Profile()
+        torch_profiler = torch.profiler.profile(activities=activities)
+        try:
+            with torch_profiler:
+                cpu_profiler.enable()
+                try:
+                    yield prefix
+                finally:
+                    cpu_profiler.disable()
+        finally:
+            # Jobs that time out, are cancelled or crash are the ones worth a profile
+            try:
+                self._write_reports(prefix, cpu_profiler, torch_profiler)
+            except Exception as e:
+                print(f"⚠ Could not write profile for job {label}: {e}")
+
+    def _write_reports(self, prefix, cpu_profiler, torch_profiler):
+        # Chrome trace: open in chrome://tracing or https://ui.perfetto.dev
+        torch_profiler.export_chrome_trace(f"{prefix}_trace.json")
+
+        # Raw cProfile stats: load with snakeviz, flameprof or pstats
+        cpu_profiler.dump_stats(f"{prefix}.prof")
+
+        sort_key = 'self_cuda_time_total' if torch.cuda.is_available() else 'self_cpu_time_total'
+        operator_table = torch_profiler.key_averages().table(sort_by=sort_key, row_limit=self.top_n)
+
+        stream = io.StringIO()
+        pstats.Stats(cpu_profiler, stream=stream).sort_stats('cumulative').print_stats(self.top_n)
+
+        with open(f"{prefix}_top.txt", 'w') as f:
+            f.write(f"=== Top {self.top_n} torch operators ({sort_key}) ===\n")
+            f.write(operator_table)
+            f.write(f"\n\n=== Top {self.top_n} Python functions (cumulative) ===\n")
+            f.write(stream.getvalue())
+
+        print(f"✓ Profile written: {prefix}_trace.json, {prefix}.prof, {prefix}_top.txt")
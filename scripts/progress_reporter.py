@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Progress Reporter
+Rolling throughput and ETA, written to a status JSON and a Prometheus textfile metrics file
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+METRIC_PREFIX = 'autofooocus'
+
+
+def atomic_write(path, text):
+    """Write via a temp file in the same directory, so scrapers never see a partial file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+class ProgressReporter:
+    """
+    Tracks batch progress and periodically rewrites status/metrics files.
+
+    Rates are computed over the last `window` seconds of wall time, so a
+    stalled worker shows a falling images/hour instead of its lifetime mean.
+    A background thread does the writing, which keeps the files (and their
+    heartbeat timestamp) fresh while the main thread is inside the sampler.
+    """
+
+    def __init__(self, total_jobs, status_path=None, metrics_path=None, interval=15.0, window=3600.0,
+                 labels=None):
+        self.total_jobs = total_jobs
+        self.status_path = status_path
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.window = window
+        self.labels = dict(labels or {})
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.started = time.time()
+        self.finished = None
+        self.done_jobs = 0
+        self.status_counts = {}
+        self.images = 0
+        self.completions = deque()  # (timestamp, jobs, images)
+        self.stage_totals = {}
+        self.busy_seconds = 0.0
+        self.current = None
+        self.last_progress = self.started
+
+    def start(self):
+        self.write()
+        if self.interval and self.interval > 0:
+            self.thread = threading.Thread(target=self._run, name='progress-reporter', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.lock:
+            self.finished = time.time()
+            self.current = None
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.write()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"⚠ Could not write progress files: {e}")
+
+    def job_started(self, description, jobs=1):
+        with self.lock:
+            self.current = {
+                'description': description,
+                'jobs': jobs,
+                'started': time.time(),
+                'step': None,
+                'total_steps': None,
+            }
+            self.last_progress = time.time()
+
+    def step_callback(self, step, x0, x, total_steps, preview=None):
+        """Signature-compatible with modules.core.ksampler's callback_function"""
+        with self.lock:
+            if self.current is not None:
+                self.current['step'] = step + 1
+                self.current['total_steps'] = total_steps
+            self.last_progress = time.time()
+
+    def job_finished(self, job_stats, jobs=1):
+        """Record a finished job, or a pack of `jobs` jobs that shared one job_stats"""
+        now = time.time()
+        status = job_stats.get('status', 'failed')
+        images = jobs if status == 'ok' else 0
+        with self.lock:
+            self.done_jobs += jobs
+            self.status_counts[status] = self.status_counts.get(status, 0) + jobs
+            self.images += images
+            self.completions.append((now, jobs, images))
+            self.busy_seconds += job_stats.get('elapsed_seconds', 0.0)
+            for name, seconds in job_stats.get('stage_seconds', {}).items():
+                total = self.stage_totals.setdefault(name, [0.0, 0])
+                total[0] += seconds
+                total[1] += jobs
+            self.current = None
+            self.last_progress = now
+
+    def jobs_skipped(self, jobs=1, status='skipped'):
+        """Count jobs that finish without running, e.g. skipped or reused from an earlier run"""
+        with self.lock:
+            self.done_jobs += jobs
+            self.status_counts[status] = self.status_counts.get(status, 0) + jobs
+            self.current = None
+
+    def _rates(self, now):
+        """(jobs/second, images/second) over the rolling window; None before anything finished"""
+        while self.completions and self.completions[0][0] < now - self.window:
+            self.completions.popleft()
+        if not self.completions:
+            return None, None
+        span = now - max(self.started, now - self.window)
+        if span <= 0:
+            return None, None
+        jobs = sum(entry[1] for entry in self.completions)
+        images = sum(entry[2] for entry in self.completions)
+        return jobs / span, images / span
+
+    def status(self):
+        """Snapshot of progress as a JSON-serializable dict"""
+        now = time.time()
+        with self.lock:
+            job_rate, image_rate = self._rates(now)
+            remaining = max(self.total_jobs - self.done_jobs, 0)
+            if self.finished:
+                eta = 0.0
+            elif remaining and job_rate:
+                eta = remaining / job_rate
+            else:
+                eta = None
+
+            current = None
+            if self.current is not None:
+                current = dict(self.current, elapsed_seconds=now - self.current['started'])
+
+            measured = sum(count for status, count in self.status_counts.items() if status not in ('skipped', 'reused'))
+            return {
+                'state': 'finished' if self.finished else 'running',
+                'host': socket.gethostname(),
+                'pid': os.getpid(),
+                'labels': self.labels,
+                'started_at': datetime.fromtimestamp(self.started).isoformat(),
+                'updated_at': datetime.fromtimestamp(now).isoformat(),
+                'uptime_seconds': (self.finished or now) - self.started,
+                'total_jobs': self.total_jobs,
+                'done_jobs': self.done_jobs,
+                'remaining_jobs': remaining,
+                'images': self.images,
+                'status_counts': dict(self.status_counts),
+                'images_per_hour': image_rate * 3600 if image_rate is not None else None,
+                'seconds_per_job': self.busy_seconds / measured if measured else None,
+                'stage_avg_seconds': {name: total / count for name, (total, count) in self.stage_totals.items()},
+                'eta_seconds': eta,
+                'eta_at': datetime.fromtimestamp(now + eta).isoformat() if eta is not None else None,
+                'seconds_since_progress': now - self.last_progress,
+                'last_progress_timestamp': self.last_progress,
+                'current_job': current,
+            }
+
+    def metrics(self, status=None):
+        """Render a status snapshot in the Prometheus text exposition format"""
+        status = status or self.status()
+        labels = self.labels
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for extra, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{_labels(dict(labels, **extra))} {float(value)!r}")
+
+        current = status['current_job'] or {}
+        metric('up', 'gauge', 'Whether the batch is still running.',
+               [({}, status['state'] == 'running')])
+        metric('start_time_seconds', 'gauge', 'Unix time the batch started.',
+               [({}, self.started)])
+        metric('last_update_timestamp_seconds', 'gauge', 'Unix time this file was written.',
+               [({}, time.time())])
+        metric('last_progress_timestamp_seconds', 'gauge', 'Unix time of the last sampler step or finished job.',
+               [({}, status['last_progress_timestamp'])])
+        metric('jobs_planned', 'gauge', 'Jobs in the batch plan.',
+               [({}, status['total_jobs'])])
+        metric('jobs_done', 'gauge', 'Jobs finished, by status.',
+               [({'status': name}, count) for name, count in sorted(status['status_counts'].items())])
+        metric('jobs_remaining', 'gauge', 'Jobs not yet finished.',
+               [({}, status['remaining_jobs'])])
+        metric('images_per_hour', 'gauge', 'Images produced per hour over the rolling window.',
+               [({}, status['images_per_hour'])])
+        metric('eta_seconds', 'gauge', 'Estimated seconds until the batch plan is finished.',
+               [({}, status['eta_seconds'])])
+        metric('stage_avg_seconds', 'gauge', 'Average wall seconds per job in each pipeline stage.',
+               [({'stage': name}, seconds) for name, seconds in sorted(status['stage_avg_seconds'].items())])
+        metric('current_step', 'gauge', 'Sampler step of the job in flight.',
+               [({}, current.get('step'))])
+        metric('current_total_steps', 'gauge', 'Total sampler steps of the job in flight.',
+               [({}, current.get('total_steps'))])
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """Atomically rewrite the status JSON and the metrics file"""
+        status = self.status()
+        if self.status_path:
+            atomic_write(self.status_path, json.dumps(status, indent=2))
+        if self.metrics_path:
+            atomic_write(self.metrics_path, self.metrics(status))
+
+    def summary_line(self):
+        status = self.status()
+        rate = status['images_per_hour']
+        line = f"📈 {status['done_jobs']}/{status['total_jobs']} done"
+        line += f" | {rate:.1f} img/h" if rate is not None else " | ? img/h"
+        line += f" | ETA {format_duration(status['eta_seconds'])}"
+        if status['eta_at']:
+            line += f" ({status['eta_at'][11:16]})"
+        return line
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Prompt Batching
+Packs jobs with different prompts and seeds into one latent batch per sampler call
+"""
+
+import math
+from contextlib import contextmanager
+
+import torch
+
+
+def pack_jobs(jobs, batch_size, key=lambda job: job['model']):
+    """
+    Group jobs that can share a sampler call, at most batch_size per pack.
+
+    Jobs are grouped by `key` (everything that must match across the batch)
+    in order of first appearance; order within a group is preserved.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault(key(job), []).append(job)
+
+    packs = []
+    for group in groups.values():
+        for start in range(0, len(group), max(batch_size, 1)):
+            packs.append(group[start:start + batch_size])
+    return packs
+
+
+def concat_conditioning(conds):
+    """
+    Stack single-prompt Fooocus conditionings into one per-sample batch.
+
+    Prompts longer than 75 tokens encode to more 77-token chunks; shorter
+    conditionings are tiled up to the common length, which leaves
+    cross-attention unchanged since duplicated keys keep the same weights.
+    """
+    tensors = [cond[0][0] for cond in conds]
+    pooled = [cond[0][1]['pooled_output'] for cond in conds]
+
+    length = 1
+    for tensor in tensors:
+        length = length * tensor.shape[1] // math.gcd(length, tensor.shape[1])
+    tensors = [tensor.repeat(1, length // tensor.shape[1], 1) for tensor in tensors]
+
+    return [[torch.cat(tensors, dim=0), {'pooled_output': torch.cat(pooled, dim=0)}]]
+
+
+@contextmanager
+def per_sample_noise(seeds):
+    """
+    Draw every sample's noise from its own seed.
+
+    Covers the starting noise, the per-step noise of ancestral samplers and the
+    Brownian tree of SDE samplers, so sample i gets exactly the noise a
+    batch-of-one run with seeds[i] gets under this context; a packed job is
+    reproduced by rerunning its seed alone or in any other pack.
+    """
+    import ldm_patched.modules.sample as sample
+    import ldm_patched.k_diffusion.sampling as k_sampling
+
+    seeds = list(seeds)
+    originals = (sample.prepare_noise, k_sampling.default_noise_sampler, k_sampling.BrownianTreeNoiseSampler)
+    tree_sampler = originals[2]
+
+    def prepare_noise(latent_image, seed, noise_inds=None):
+        shape = [1] + list(latent_image.size())[1:]
+        return torch.cat([
+            torch.randn(shape, dtype=latent_image.dtype, layout=latent_image.layout,
+                        generator=torch.manual_seed(s), device='cpu')
+            for s in seeds
+        ])
+
+    def default_noise_sampler(x):
+        # Separate streams from the starting noise, so step noise does not repeat it
+        generators = [torch.Generator().manual_seed(s + 1) for s in seeds]
+        shape = [1] + list(x.shape)[1:]
+
+        def noise_sampler(sigma, sigma_next):
+            noise = torch.cat([torch.randn(shape, generator=generator) for generator in generators])
+            return noise.to(device=x.device, dtype=x.dtype)
+        return noise_sampler
+
+    class BrownianTreeNoiseSampler(tree_sampler):
+        def __init__(self, x, sigma_min, sigma_max, seed=None, **kwargs):
+            # BatchedBrownianTree builds one tree per sample when given a list of seeds
+            if hasattr(tree_sampler, 'global_init'):
+                # Fooocus's patched sampler keeps a single tree in class state
+                tree_sampler.global_init(x, sigma_min, sigma_max, seed=seeds, **kwargs)
+            else:
+                super().__init__(x, sigma_min, sigma_max, seed=seeds, **kwargs)
+
+    sample.prepare_noise = prepare_noise
+    k_sampling.default_noise_sampler = default_noise_sampler
+    k_sampling.BrownianTreeNoiseSampler = BrownianTreeNoiseSampler
+    try:
+        yield
+    finally:
+        sample.prepare_noise, k_sampling.default_noise_sampler, k_sampling.BrownianTreeNoiseSampler = originals
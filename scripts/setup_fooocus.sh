@@ -76,6 +76,16 @@ copy_scripts() {
     cp scripts/working_batch.py "$WORK_DIR/"
     cp scripts/view_results.py "$WORK_DIR/"
     cp scripts/device_optimizer.py "$WORK_DIR/"
+    cp scripts/tiled_vae.py "$WORK_DIR/"
+    cp scripts/image_hash.py "$WORK_DIR/"
+    cp scripts/contact_sheet.py "$WORK_DIR/"
+    cp scripts/profiling.py "$WORK_DIR/"
+    cp scripts/job_control.py "$WORK_DIR/"
+    cp scripts/latent_checkpoint.py "$WORK_DIR/"
+    cp scripts/download_models.py "$WORK_DIR/"
+    cp scripts/adaptive_steps.py "$WORK_DIR/"
+    cp scripts/prompt_batching.py "$WORK_DIR/"
+    cp scripts/progress_reporter.py "$WORK_DIR/"
     
     # Copy shell scripts
     cp scripts/run_batch.sh "$WORK_DIR/"
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+AutoFooocus Tiled VAE Decoder
+Decodes large latents in overlapping, seam-blended tiles to cap peak memory
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+# SDXL/SD1.5 VAEs upscale latents by a factor of 8
+LATENT_SCALE = 8
+
+
+def tile_starts(length, tile, overlap):
+    """Return tile start offsets covering [0, length) with the given overlap"""
+    if length <= tile:
+        return [0]
+
+    stride = max(tile - overlap, 1)
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] + tile < length:
+        starts.append(length - tile)
+    return starts
+
+
+def blend_ramp(length, overlap, ramp_start, ramp_end, dtype=torch.float32):
+    """1D blend weights: linear ramps on interior edges, flat on image borders"""
+    weights = torch.ones(length, dtype=dtype)
+    if overlap <= 0:
+        return weights
+
+    overlap = min(overlap, length)
+    ramp = torch.linspace(0.0, 1.0, overlap + 2, dtype=dtype)[1:-1]
+    if ramp_start:
+        weights[:overlap] = ramp
+    if ramp_end:
+        weights[-overlap:] = torch.minimum(weights[-overlap:], ramp.flip(0))
+    return weights
+
+
+def plan_tiles(latent_height, latent_width, tile_size=512, overlap=64):
+    """Plan latent-space tiles as (y, x, height, width) tuples"""
+    tile = max(tile_size // LATENT_SCALE, 1)
+    pad = max(min(overlap // LATENT_SCALE, tile // 2), 0)
+
+    tiles = []
+    for y in tile_starts(latent_height, tile, pad):
+        for x in tile_starts(latent_width, tile, pad):
+            tiles.append((y, x, min(tile, latent_height), min(tile, latent_width)))
+    return tiles, pad
+
+
+def decode_tiled(decode_fn, samples, tile_size=512, overlap=64, workers=1):
+    """
+    Decode a latent tensor tile by tile and blend the overlaps.
+
+    decode_fn takes a (B, C, h, w) latent tile and returns (B, h*8, w*8, 3)
+    pixels, matching the layout produced by modules.core.decode_vae.
+    At most `workers` tiles are decoded concurrently, which bounds memory;
+    with workers > 1, decode_fn must be safe to call from several threads.
+    """
+    batch, _, latent_height, latent_width = samples.shape
+    tiles, pad = plan_tiles(latent_height, latent_width, tile_size, overlap)
+
+    if len(tiles) == 1:
+        return decode_fn(samples)
+
+    height = latent_height * LATENT_SCALE
+    width = latent_width * LATENT_SCALE
+    output = None
+    weight_sum = torch.zeros((1, height, width, 1), dtype=torch.float32)
+
+    def decode_tile(tile):
+        y, x, th, tw = tile
+        return tile, decode_fn(samples[:, :, y:y + th, x:x + tw])
+
+    def accumulate(tile, pixels):
+        nonlocal output
+        y, x, th, tw = tile
+        pixels = pixels.to(device='cpu', dtype=torch.float32)
+        if output is None:
+            output = torch.zeros((batch, height, width, pixels.shape[-1]), dtype=torch.float32)
+
+        wy = blend_ramp(th * LATENT_SCALE, pad * LATENT_SCALE, y > 0, y + th < latent_height)
+        wx = blend_ramp(tw * LATENT_SCALE, pad * LATENT_SCALE, x > 0, x + tw < latent_width)
+        mask = (wy[:, None] * wx[None, :])[None, :, :, None]
+
+        py, px = y * LATENT_SCALE, x * LATENT_SCALE
+        ph, pw = th * LATENT_SCALE, tw * LATENT_SCALE
+        output[:, py:py + ph, px:px + pw, :] += pixels * mask
+        weight_sum[:, py:py + ph, px:px + pw, :] += mask
+
+    workers = max(int(workers or 1), 1)
+    if workers == 1:
+        for tile in tiles:
+            accumulate(*decode_tile(tile))
+    else:
+        # Submit in waves so no more than `workers` decoded tiles are alive at once
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i in range(0, len(tiles), workers):
+                for tile, pixels in executor.map(decode_tile, tiles[i:i + workers]):
+                    accumulate(tile, pixels)
+
+    return output / weight_sum.clamp_min(1e-6)
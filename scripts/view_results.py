@@ -12,11 +12,23 @@ from datetime import datetime
 import shutil
 from typing import List, Dict, Optional
 
+try:
+    import numpy as np
+    import image_hash
+    import contact_sheet
+except ImportError:
+    np = None
+    image_hash = None
+    contact_sheet = None
+
+HASH_INDEX_FILE = 'hash_index.json'
+
 
 class ResultsViewer:
     def __init__(self, results_dir: str):
         self.results_dir = Path(results_dir)
         self.results = []
+        self.clusters = []
         
     def load_results(self):
         """Load all results from batch outputs"""
@@ -121,6 +133,120 @@ class ResultsViewer:
                     
                     print(f"Copied: {dst_image.name}")
     
+    def load_hash_index(self) -> Dict[str, Dict]:
+        """Load cached perceptual hashes, keyed by path relative to the results dir"""
+        index_file = self.results_dir / HASH_INDEX_FILE
+        if not index_file.exists():
+            return {}
+        with open(index_file, 'r') as f:
+            return json.load(f)
+    
+    def save_hash_index(self, index: Dict[str, Dict]):
+        """Atomically rewrite the hash cache"""
+        index_file = self.results_dir / HASH_INDEX_FILE
+        tmp_file = index_file.with_suffix('.json.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, index_file)
+    
+    def compute_hashes(self, hash_type: str = 'phash'):
+        """Return one hash per result, computing only those missing from the cache"""
+        index = self.load_hash_index()
+        keys = []
+        missing = []
+        
+        for result in self.results:
+            image_path = result['full_path']
+            if not image_path.exists():
+                keys.append(None)
+                continue
+            key = os.path.relpath(image_path, self.results_dir)
+            keys.append(key)
+            stat = image_path.stat()
+            cached = index.get(key)
+            if not cached or cached['mtime'] != stat.st_mtime or cached['size'] != stat.st_size:
+                missing.append((key, image_path, stat))
+        
+        if missing:
+            print(f"Hashing {len(missing)} new images ({len(self.results) - len(missing)} cached)...")
+            chunk_size = 1024
+            unreadable = 0
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                hashes = image_hash.compute_hashes([path for _, path, _ in chunk])
+                for i, (key, _, stat) in enumerate(chunk):
+                    if not hashes['valid'][i]:
+                        # Leave it out of the index so it is retried once the file is complete
+                        index.pop(key, None)
+                        unreadable += 1
+                        continue
+                    index[key] = {
+                        'mtime': stat.st_mtime,
+                        'size': stat.st_size,
+                        'phash': f"{int(hashes['phash'][i]):016x}",
+                        'dhash': f"{int(hashes['dhash'][i]):016x}",
+                    }
+            self.save_hash_index(index)
+            if unreadable:
+                print(f"⚠ Skipped {unreadable} unreadable images")
+        
+        present = [i for i, key in enumerate(keys) if key in index]
+        hashes = np.array([int(index[keys[i]][hash_type], 16) for i in present], dtype=np.uint64)
+        return present, hashes
+    
+    def find_duplicates(self, hash_type: str = 'phash', threshold: int = 6) -> List[List[int]]:
+        """Cluster near-duplicate results by perceptual hash distance"""
+        if image_hash is None:
+            print("Error: --dedupe requires numpy and Pillow (run inside the Fooocus venv)")
+            return []
+        
+        present, hashes = self.compute_hashes(hash_type)
+        clusters = image_hash.cluster_hashes(hashes, threshold)
+        # Map positions in the hash array back to result indices
+        self.clusters = [[present[i] for i in cluster] for cluster in clusters]
+        return self.clusters
+    
+    def show_duplicates(self, limit: int = 20):
+        """Print near-duplicate clusters"""
+        duplicates = sum(len(cluster) - 1 for cluster in self.clusters)
+        print(f"\n=== Near-Duplicates ===")
+        print(f"{len(self.clusters)} clusters, {duplicates} redundant images")
+        
+        for cluster in self.clusters[:limit]:
+            keep = self.results[cluster[0]]
+            print(f"\n[{cluster[0]}] {keep['filename']} - Base: {keep['base_model'][:30]}")
+            for idx in cluster[1:]:
+                result = self.results[idx]
+                print(f"  ~ [{idx}] {result['filename']} - Base: {result['base_model'][:30]}")
+        
+        if len(self.clusters) > limit:
+            print(f"\n... {len(self.clusters) - limit} more clusters")
+    
+    def create_grids(self, row_axis: str = 'prompt', col_axis: str = 'base_model', cell_size: int = 256):
+        """Render one contact sheet per batch, laid out along two config axes"""
+        if contact_sheet is None:
+            print("Error: --grid requires numpy and Pillow (run inside the Fooocus venv)")
+            return []
+        
+        batches = {}
+        for result in self.results:
+            batches.setdefault(result['batch_dir'], []).append(result)
+        
+        safe_name = lambda axis: axis.replace('.', '_')
+        outputs = []
+        for batch_dir, results in sorted(batches.items()):
+            rows, cols, cells, skipped = contact_sheet.build_matrix(results, row_axis, col_axis)
+            output_path = self.results_dir / batch_dir / f"grid_{safe_name(row_axis)}_x_{safe_name(col_axis)}.png"
+            width, height = contact_sheet.render_grid(rows, cols, cells, output_path, cell=cell_size)
+            
+            print(f"Grid created: {output_path} ({len(rows)}x{len(cols)} cells, {width}x{height}px)")
+            if skipped:
+                print(f"  {skipped} results shared a cell with another and were left out; "
+                      f"filter or pick other axes to see them")
+            outputs.append(output_path)
+        
+        return outputs
+    
     def create_comparison_html(self, output_file: str = "comparison.html"):
         """Create an HTML file for easy comparison"""
         html_content = """
@@ -137,6 +263,7 @@ class ResultsViewer:
         .filters { margin-bottom: 20px; padding: 20px; background: #f5f5f5; border-radius: 5px; }
         .filter-group { margin-bottom: 10px; }
         .highlight { background-color: yellow; }
+        .dupe-badge { color: #a60; font-weight: bold; }
     </style>
 </head>
 <body>
@@ -155,11 +282,20 @@ class ResultsViewer:
             <label><input type="checkbox" id="showLoras" checked onchange="filterImages()"> Show with LoRAs</label>
             <label><input type="checkbox" id="showNoLoras" checked onchange="filterImages()"> Show without LoRAs</label>
         </div>
+        <div class="filter-group">
+            <label><input type="checkbox" id="collapseDupes" checked onchange="filterImages()"> Collapse near-duplicates</label>
+        </div>
     </div>
     
     <div class="gallery" id="gallery">
 """
         
+        duplicate_of = {}
+        for cluster in self.clusters:
+            for idx in cluster[1:]:
+                duplicate_of[idx] = cluster[0]
+        cluster_of = {cluster[0]: cluster for cluster in self.clusters}
+        
         for idx, result in enumerate(self.results):
             image_path = result['full_path']
             if image_path.exists():
@@ -171,11 +307,19 @@ class ResultsViewer:
                 has_loras = len(result['loras']) > 0
                 lora_names = ', '.join([l['name'] for l in result['loras']])
                 
+                dupe_info = ''
+                if idx in cluster_of:
+                    others = ', '.join(str(i) for i in cluster_of[idx][1:])
+                    dupe_info = f'<span class="dupe-badge">Near-duplicates:</span> {others}<br>'
+                elif idx in duplicate_of:
+                    dupe_info = f'<span class="dupe-badge">Near-duplicate of:</span> {duplicate_of[idx]}<br>'
+                
                 html_content += f"""
         <div class="image-card" data-index="{idx}" 
              data-prompt="{result['prompt'].lower()}"
              data-has-refiner="{has_refiner}"
-             data-has-loras="{has_loras}">
+             data-has-loras="{has_loras}"
+             data-duplicate="{idx in duplicate_of}">
             <img src="{rel_path}" onclick="window.open(this.src)" alt="Result {idx}">
             <div class="metadata">
                 <strong>Index:</strong> {idx}<br>
@@ -184,6 +328,7 @@ class ResultsViewer:
                 <strong>LoRAs:</strong> {lora_names or 'None'}<br>
                 <strong>Steps:</strong> {result['settings']['steps']}<br>
                 <strong>CFG:</strong> {result['settings']['cfg_scale']}<br>
+                {dupe_info}
                 <details>
                     <summary>Prompt</summary>
                     <p>{result['prompt']}</p>
@@ -202,6 +347,7 @@ class ResultsViewer:
         const showNoRefiner = document.getElementById('showNoRefiner').checked;
         const showLoras = document.getElementById('showLoras').checked;
         const showNoLoras = document.getElementById('showNoLoras').checked;
+        const collapseDupes = document.getElementById('collapseDupes').checked;
         
         const cards = document.querySelectorAll('.image-card');
         
@@ -209,6 +355,7 @@ class ResultsViewer:
             const prompt = card.getAttribute('data-prompt');
             const hasRefiner = card.getAttribute('data-has-refiner') === 'True';
             const hasLoras = card.getAttribute('data-has-loras') === 'True';
+            const isDuplicate = card.getAttribute('data-duplicate') === 'True';
             
             let show = true;
             
@@ -225,9 +372,13 @@ class ResultsViewer:
             if (hasLoras && !showLoras) show = false;
             if (!hasLoras && !showNoLoras) show = false;
             
+            // Near-duplicate filter
+            if (isDuplicate && collapseDupes) show = false;
+            
             card.style.display = show ? 'block' : 'none';
         });
     }
+    filterImages();
     </script>
 </body>
 </html>
@@ -253,6 +404,13 @@ def main():
     parser.add_argument('--copy-best', nargs='+', type=int, help='Copy best results by index')
     parser.add_argument('--copy-to', type=str, default='best_results', help='Directory for best results')
     parser.add_argument('--html', action='store_true', help='Create HTML comparison page')
+    parser.add_argument('--grid', action='store_true', help='Create one contact-sheet grid image per batch')
+    parser.add_argument('--grid-rows', type=str, default='prompt', help='Grid row axis (e.g. prompt, settings.steps)')
+    parser.add_argument('--grid-cols', type=str, default='base_model', help='Grid column axis (e.g. base_model, loras)')
+    parser.add_argument('--grid-cell', type=int, default=256, help='Grid cell size in pixels')
+    parser.add_argument('--dedupe', action='store_true', help='Find near-duplicate results by perceptual hash')
+    parser.add_argument('--dedupe-hash', choices=['phash', 'dhash'], default='phash', help='Perceptual hash type')
+    parser.add_argument('--dedupe-threshold', type=int, default=6, help='Max Hamming distance (bits) for near-duplicates')
     
     args = parser.parse_args()
     
@@ -281,10 +439,19 @@ def main():
         for idx, result in enumerate(filtered[:20]):  # Show first 20
             print(f"{idx}: {result['filename']} - Base: {result['base_model'][:30]}")
     
+    # Find near-duplicates (collapsed in the HTML gallery when --html is also given)
+    if args.dedupe:
+        viewer.find_duplicates(args.dedupe_hash, args.dedupe_threshold)
+        viewer.show_duplicates()
+    
     # Copy best results
     if args.copy_best:
         viewer.copy_best_results(args.copy_best, args.copy_to)
     
+    # Create contact sheets
+    if args.grid:
+        viewer.create_grids(args.grid_rows, args.grid_cols, args.grid_cell)
+    
     # Create HTML
     if args.html:
         viewer.create_comparison_html()
@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import time
+import contextlib
 from datetime import datetime
 from pathlib import Path
 
@@ -43,8 +44,23 @@ import modules.default_pipeline as pipeline
 import modules.config as config
 import modules.patch
 import modules.core
+import ldm_patched.modules.model_management as model_management
 from modules.util import generate_temp_filename
 import numpy as np
+import torch
+
+from tiled_vae import decode_tiled
+from profiling import JobProfiler, stage
+from job_control import JobController, JobCancelled
+from latent_checkpoint import LatentCheckpointer, raw_latent_input, set_rng_state
+from adaptive_steps import ConvergenceMonitor, ConvergenceStop, calibration_rows
+from prompt_batching import pack_jobs, concat_conditioning, per_sample_noise
+from progress_reporter import ProgressReporter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 
 def apply_device_optimizations():
@@ -92,23 +108,23 @@ def initialize_fooocus():
     
     # Download required models if missing
     print("Checking required model files...")
-    from modules.model_loader import load_file_from_url
+    from download_models import DownloadManager
     
-    # Download VAE approximation models
-    vae_approx_filenames = [
-        ('xlvaeapp.pth', 'https://huggingface.co/lllyasviel/misc/resolve/main/xlvaeapp.pth'),
-        ('vaeapp_sd15.pth', 'https://huggingface.co/lllyasviel/misc/resolve/main/vaeapp_sd15.pt'),
+    required_files = [
+        # VAE approximation models
+        ('https://huggingface.co/lllyasviel/misc/resolve/main/xlvaeapp.pth', config.path_vae_approx, 'xlvaeapp.pth'),
+        ('https://huggingface.co/lllyasviel/misc/resolve/main/vaeapp_sd15.pt', config.path_vae_approx, 'vaeapp_sd15.pth'),
+        # Prompt expansion model
+        ('https://huggingface.co/lllyasviel/misc/resolve/main/fooocus_expansion.bin',
+         config.path_fooocus_expansion, 'pytorch_model.bin'),
     ]
     
-    for file_name, url in vae_approx_filenames:
-        load_file_from_url(url=url, model_dir=config.path_vae_approx, file_name=file_name)
-    
-    # Download expansion model if missing
-    load_file_from_url(
-        url='https://huggingface.co/lllyasviel/misc/resolve/main/fooocus_expansion.bin',
-        model_dir=config.path_fooocus_expansion,
-        file_name='pytorch_model.bin'
-    )
+    failures = DownloadManager().download_all([
+        {'url': url, 'path': os.path.join(model_dir, file_name)}
+        for url, model_dir, file_name in required_files
+    ])
+    if failures:
+        raise RuntimeError(f"Failed to download required files: {', '.join(str(item['path']) for item, _ in failures)}")
     
     # Convert LoRA format and filter enabled ones
     filtered_loras = []
@@ -126,28 +142,217 @@ def initialize_fooocus():
     print("✓ Fooocus initialized with device optimizations")
 
 
-def generate_image_direct(prompt, negative_prompt="", steps=None, cfg=7.0, width=1024, height=1024, seed=-1):
+def reset_peak_memory():
+    """
+    Reset the peak memory counters before a job.
+    
+    Returns the scope get_peak_memory_mb() will then report: 'job' when the
+    counter was reset, 'process' when only the lifetime high-water mark exists.
+    """
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+        return 'job'
+    try:
+        # Linux: writing 5 resets the VmHWM (peak RSS) of this process
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return 'job'
+    except OSError:
+        return 'process'
+
+
+def read_vm_hwm_kb():
+    """Peak RSS since the last clear_refs reset, from /proc/self/status (Linux), or None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def get_peak_memory_mb():
+    """Return peak device memory (CUDA) or peak process RSS (CPU/MPS) in MB"""
+    if torch.cuda.is_available():
+        return torch.cuda.max_memory_allocated() / (1024 ** 2)
+    hwm = read_vm_hwm_kb()
+    if hwm is not None:
+        return hwm / 1024
+    if resource is not None:
+        # ru_maxrss is KB on Linux and bytes on macOS; it is a process-wide high-water mark
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 ** 2) if sys.platform == 'darwin' else peak / 1024
+    return None
+
+
+def decode_latent(samples, settings=None, controller=None):
+    """Decode latents, using the tiled decoder when enabled for this device"""
+    settings = settings or {}
+    device_settings = DEVICE_CONFIG["device_settings"]
+    generation_settings = DEVICE_CONFIG["generation_settings"]
+    
+    tiling = settings.get("vae_tiling", generation_settings.get("enable_vae_tiling", False))
+    if not tiling:
+        return modules.core.decode_vae(vae=pipeline.final_vae, latent_image=samples)
+    
+    tile_size = settings.get("vae_tile_size", generation_settings.get("vae_tile_size", 512))
+    overlap = settings.get("vae_tile_overlap", generation_settings.get("vae_tile_overlap", 64))
+    # Threads only help on CPU; on GPU tiles would just contend for the same device
+    workers = 1
+    if device_settings["device"] == "cpu":
+        workers = settings.get("vae_tile_workers", generation_settings.get("vae_tile_workers", 1))
+    
+    print(f"Tiled VAE decode: {tile_size}px tiles, {overlap}px overlap, {workers} worker(s)")
+    
+    vae = pipeline.final_vae
+    if workers <= 1:
+        # ldm_patched's own tiled decoder (what decode_vae(tiled=True) uses), with our tile size and overlap
+        with torch.inference_mode():
+            return vae.decode_tiled(samples['samples'], tile_x=tile_size // 8, tile_y=tile_size // 8,
+                                    overlap=overlap // 8)
+    
+    # Load the VAE once, then let each thread call the decoder network directly;
+    # VAE.decode would re-run model loading and memory estimation from every thread
+    model_management.load_models_gpu([vae.patcher])
+    
+    def decode_fn(latent_tile):
+        # Lets budgets and cancellation stop a long decode between tiles
+        if controller:
+            controller.check()
+        with torch.inference_mode():  # thread-local, so enter it in each worker
+            pixels = vae.first_stage_model.decode(latent_tile.to(device=vae.device, dtype=vae.vae_dtype))
+            pixels = torch.clamp((pixels.float() + 1.0) / 2.0, min=0.0, max=1.0)
+            return pixels.movedim(1, -1)
+    
+    return decode_tiled(decode_fn, samples['samples'], tile_size=tile_size, overlap=overlap, workers=workers)
+
+
+def select_sampler(sampler_name=None, scheduler_name=None):
+    """Device-optimized sampler and scheduler, unless the caller overrides them"""
+    device_settings = DEVICE_CONFIG["device_settings"]
+    generation_settings = DEVICE_CONFIG["generation_settings"]
+    
+    if scheduler_name is None:
+        scheduler_name = generation_settings.get("scheduler", "karras")
+    if sampler_name is None:
+        if device_settings["device"] == "cpu":
+            sampler_name = "euler_a"  # Faster on CPU
+        elif device_settings["device"] == "mps":
+            sampler_name = "dpmpp_2m_sde"  # Better MPS compatibility
+        else:
+            sampler_name = "dpmpp_2m_sde_gpu"  # Full GPU acceleration
+    return sampler_name, scheduler_name
+
+
+def adjust_resolution(width, height, settings):
+    """Clamp CPU resolution when tiled VAE decoding is off"""
+    device_settings = DEVICE_CONFIG["device_settings"]
+    generation_settings = DEVICE_CONFIG["generation_settings"]
+    
+    tiling = settings.get("vae_tiling", generation_settings.get("enable_vae_tiling", False))
+    if device_settings["device"] == "cpu" and not tiling:
+        # Without tiled decoding, full-resolution VAE decode may not fit in memory
+        if width > 768 or height > 768:
+            width, height = 768, 768
+            print(f"📱 Adjusted resolution to {width}x{height} for CPU performance")
+    return width, height
+
+
+def run_sampler(latent, positive_cond, negative_cond, seed, steps, cfg, sampler_name, scheduler_name,
+                step_callbacks, job_stats, **kwargs):
+    """Run modules.core.ksampler, decoding the current prediction if adaptive steps stop it early"""
+    def callback_function(step, x0, x, total_steps, preview=None):
+        for callback in step_callbacks:
+            callback(step, x0, x, total_steps, preview)
+    
+    try:
+        samples = modules.core.ksampler(
+            model=pipeline.final_unet,
+            seed=seed,
+            steps=steps,
+            cfg=cfg,
+            sampler_name=sampler_name,
+            scheduler=scheduler_name,
+            positive=positive_cond,
+            negative=negative_cond,
+            latent=latent,
+            denoise=1.0,
+            callback_function=callback_function if step_callbacks else None,
+            **kwargs
+        )
+        job_stats['steps_used'] = steps
+    except ConvergenceStop as e:
+        # The converged denoised prediction is the image; scale it out like ksampler's output
+        samples = {'samples': pipeline.final_unet.model.process_latent_out(e.x0)}
+        job_stats['steps_used'] = e.step + 1
+        print(f"✓ Converged after {e.step + 1}/{steps} steps")
+    return samples
+
+
+def save_image(pixels):
+    """Save one decoded image (float array in [0, 1]) to a temporary PNG and return its path"""
+    pixels = np.clip(pixels * 255.0, 0, 255).astype(np.uint8)
+    
+    # Convert CHW to HWC if needed
+    if pixels.shape[0] == 3:
+        pixels = np.transpose(pixels, (1, 2, 0))
+    
+    from PIL import Image
+    image = Image.fromarray(pixels)
+    
+    # Generate filename
+    date_string, temp_filename, filename = generate_temp_filename(folder=Path("outputs"), extension='png')
+    
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(temp_filename), exist_ok=True)
+    
+    image.save(temp_filename, 'PNG')
+    return temp_filename
+
+
+def generate_image_direct(prompt, negative_prompt="", steps=None, cfg=7.0, width=1024, height=1024, seed=-1,
+                          settings=None, job_stats=None, controller=None, checkpointer=None, checkpoint_key=None,
+                          sampler_name=None, scheduler_name=None, monitor=None, reporter=None):
     """Generate image using direct pipeline calls with device optimization"""
     
     # Use device-optimized defaults
     device_settings = DEVICE_CONFIG["device_settings"]
     generation_settings = DEVICE_CONFIG["generation_settings"]
+    settings = settings or {}
+    if job_stats is None:
+        job_stats = {}
     
     if steps is None:
         steps = generation_settings.get("default_steps", 30)
     
     # Adjust settings based on device
-    if device_settings["device"] == "cpu":
-        # Reduce resolution for CPU to improve speed
-        if width > 768 or height > 768:
-            width, height = 768, 768
-            print(f"📱 Adjusted resolution to {width}x{height} for CPU performance")
+    width, height = adjust_resolution(width, height, settings)
+    
+    memory_scope = reset_peak_memory()
     
     print(f"Generating: {prompt[:50]}...")
     print(f"Device: {device_settings['device_name']} | Steps: {steps} | Resolution: {width}x{height}")
     
+    # Device-optimized sampler settings (callers may override, e.g. for calibration)
+    sampler_name, scheduler_name = select_sampler(sampler_name, scheduler_name)
+    
+    # Resume from a step-level snapshot if this job was interrupted before
+    snapshot = None
+    if not checkpointer:
+        checkpoint_key = None
+    elif checkpoint_key and not checkpointer.supports(sampler_name):
+        print(f"⚠ Sampler {sampler_name} cannot be resumed exactly, checkpointing disabled for this job")
+        checkpoint_key = None
+    elif checkpoint_key:
+        snapshot = checkpointer.load(checkpoint_key)
+    
     # Generate seed if needed
-    if seed == -1:
+    if snapshot:
+        seed = snapshot['seed']
+        print(f"↻ Resuming from checkpoint at step {snapshot['step']}/{steps}")
+    elif seed == -1:
         seed = int(np.random.randint(0, 2**31))
     
     print(f"Using seed: {seed}")
@@ -158,105 +363,483 @@ def generate_image_direct(prompt, negative_prompt="", steps=None, cfg=7.0, width
     modules.patch.clip_skip = 2
     modules.patch.sharpness = 1.5
     
-    # Create empty latent
-    batch_size = device_settings.get("batch_size", 1)
-    latent = modules.core.generate_empty_latent(width=width, height=height, batch_size=batch_size)
+    # One image per job; several prompts per sampler call go through generate_images_packed
+    latent = modules.core.generate_empty_latent(width=width, height=height, batch_size=1)
+    
+    if controller:
+        controller.check()
     
     # Encode prompts using the pipeline's clip encoding function
-    positive_cond = pipeline.clip_encode([prompt])
-    negative_cond = pipeline.clip_encode([negative_prompt])
+    with stage('clip_encode', job_stats):
+        positive_cond = pipeline.clip_encode([prompt])
+        negative_cond = pipeline.clip_encode([negative_prompt])
+    
+    if controller:
+        controller.check()
     
     # Run sampling
     print("Running diffusion...")
     
-    # Device-optimized sampler settings
-    scheduler_name = generation_settings.get("scheduler", "karras")
-    if device_settings["device"] == "cpu":
-        sampler_name = "euler_a"  # Faster on CPU
-    elif device_settings["device"] == "mps":
-        sampler_name = "dpmpp_2m_sde"  # Better MPS compatibility
+    step_callbacks = []
+    resume_kwargs = {}
+    if checkpoint_key:
+        if snapshot:
+            # Continue from the snapshot's step with its exact latent and RNG state
+            latent = {'samples': snapshot['latent']}
+            set_rng_state(snapshot['rng'])
+            resume_kwargs = dict(start_step=snapshot['step'], disable_noise=True, previewer_start=snapshot['step'])
+            job_stats['resumed_from_step'] = snapshot['step']
+        else:
+            # Seed the global RNG that ancestral noise is drawn from, so runs are reproducible
+            torch.manual_seed(seed)
+        step_callbacks.append(checkpointer.step_callback(checkpoint_key, seed, resume_kwargs.get('start_step', 0)))
+    
+    # Budgets and cancellation are enforced cooperatively at every sampler step
+    if controller:
+        step_callbacks.append(controller.step_callback)
+    
+    # Live progress: current step and a heartbeat for the status/metrics files
+    if reporter:
+        step_callbacks.append(reporter.step_callback)
+    
+    # Adaptive steps: stop once the denoised prediction has converged
+    if monitor:
+        step_callbacks.append(monitor.step_callback)
+    
+    # Checkpointed jobs keep their noise in the global RNG, which snapshots capture;
+    # otherwise draw it per seed, exactly as a packed batch does for this seed
+    if snapshot:
+        sampling_context = raw_latent_input(pipeline.final_unet)
+    elif checkpoint_key:
+        sampling_context = contextlib.nullcontext()
     else:
-        sampler_name = "dpmpp_2m_sde_gpu"  # Full GPU acceleration
+        sampling_context = per_sample_noise([seed])
     
     # Perform sampling using the core ksampler
-    samples = modules.core.ksampler(
-        model=pipeline.final_unet,
-        seed=seed,
-        steps=steps,
-        cfg=cfg,
-        sampler_name=sampler_name,
-        scheduler=scheduler_name,
-        positive=positive_cond,
-        negative=negative_cond,
-        latent=latent,
-        denoise=1.0
-    )
+    with stage('ksampler', job_stats), sampling_context:
+        samples = run_sampler(latent, positive_cond, negative_cond, seed, steps, cfg, sampler_name, scheduler_name,
+                              step_callbacks, job_stats, **resume_kwargs)
+    
+    if controller:
+        controller.check()
     
     # Decode VAE
     print("Decoding image...")
-    pixels = modules.core.decode_vae(vae=pipeline.final_vae, latent_image=samples)
+    with stage('decode_vae', job_stats):
+        pixels = decode_latent(samples, settings, controller)
     
-    # Convert to numpy and save
-    pixels = pixels.cpu().numpy()
-    pixels = np.clip(pixels * 255.0, 0, 255).astype(np.uint8)
+    if controller:
+        controller.check()
     
-    # Handle batch dimension
-    if len(pixels.shape) == 4:
-        pixels = pixels[0]  # Take first image
+    with stage('save', job_stats):
+        # Convert to numpy and save
+        pixels = pixels.cpu().numpy()
+        
+        # Handle batch dimension
+        if len(pixels.shape) == 4:
+            pixels = pixels[0]  # Take first image
+        
+        temp_filename = save_image(pixels)
     
-    # Convert CHW to HWC if needed
-    if pixels.shape[0] == 3:
-        pixels = np.transpose(pixels, (1, 2, 0))
+    job_stats['seed'] = seed
+    job_stats['width'] = width
+    job_stats['height'] = height
+    job_stats['peak_memory_mb'] = get_peak_memory_mb()
+    job_stats['peak_memory_scope'] = memory_scope
     
-    # Save image
-    from PIL import Image
-    image = Image.fromarray(pixels)
+    print(f"✓ Image saved to: {temp_filename}")
+    if job_stats['peak_memory_mb'] is not None:
+        print(f"Peak memory: {job_stats['peak_memory_mb']:.0f} MB ({memory_scope})")
+    return temp_filename
+
+
+def generate_images_packed(jobs, steps, cfg=7.0, width=1024, height=1024, settings=None, job_stats=None,
+                           controller=None, monitor=None, reporter=None):
+    """
+    Generate several jobs that differ only in prompt, negative prompt and seed in one sampler call.
     
-    # Generate filename
-    date_string, temp_filename, filename = generate_temp_filename(folder=Path("outputs"), extension='png')
+    Each job dict has 'prompt', 'negative_prompt' and optionally 'seed'; returns one
+    temporary image path per job, in order. Every sample starts from its own seed's noise.
+    """
+    device_settings = DEVICE_CONFIG["device_settings"]
+    settings = settings or {}
+    if job_stats is None:
+        job_stats = {}
     
-    # Ensure output directory exists
-    os.makedirs(os.path.dirname(temp_filename), exist_ok=True)
+    width, height = adjust_resolution(width, height, settings)
     
-    image.save(temp_filename, 'PNG')
+    memory_scope = reset_peak_memory()
     
-    print(f"✓ Image saved to: {temp_filename}")
-    return temp_filename
+    print(f"Generating {len(jobs)} prompts in one batch:")
+    for job in jobs:
+        print(f"  - {job['prompt'][:50]}...")
+    print(f"Device: {device_settings['device_name']} | Steps: {steps} | Resolution: {width}x{height}")
+    
+    sampler_name, scheduler_name = select_sampler()
+    
+    seeds = [job['seed'] if job.get('seed', -1) != -1 else int(np.random.randint(0, 2**31)) for job in jobs]
+    print(f"Using seeds: {', '.join(str(seed) for seed in seeds)}")
+    
+    # Set up patch globals (required for generation)
+    modules.patch.positive_prompt = jobs[0]['prompt']
+    modules.patch.negative_prompt = jobs[0]['negative_prompt']
+    modules.patch.clip_skip = 2
+    modules.patch.sharpness = 1.5
+    
+    latent = modules.core.generate_empty_latent(width=width, height=height, batch_size=len(jobs))
+    
+    if controller:
+        controller.check()
+    
+    # One conditioning per sample, stacked along the batch dimension
+    with stage('clip_encode', job_stats):
+        positive_cond = concat_conditioning([pipeline.clip_encode([job['prompt']]) for job in jobs])
+        negative_cond = concat_conditioning([pipeline.clip_encode([job['negative_prompt']]) for job in jobs])
+    
+    if controller:
+        controller.check()
+    
+    print("Running diffusion...")
+    
+    step_callbacks = []
+    if controller:
+        step_callbacks.append(controller.step_callback)
+    if reporter:
+        step_callbacks.append(reporter.step_callback)
+    if monitor:
+        step_callbacks.append(monitor.step_callback)
+    
+    with stage('ksampler', job_stats), per_sample_noise(seeds):
+        samples = run_sampler(latent, positive_cond, negative_cond, seeds[0], steps, cfg, sampler_name, scheduler_name,
+                              step_callbacks, job_stats)
+    
+    if controller:
+        controller.check()
+    
+    print("Decoding images...")
+    with stage('decode_vae', job_stats):
+        pixels = decode_latent(samples, settings, controller)
+    
+    if controller:
+        controller.check()
+    
+    with stage('save', job_stats):
+        pixels = pixels.cpu().numpy()
+        temp_filenames = [save_image(pixels[i]) for i in range(len(jobs))]
+    
+    job_stats['seeds'] = seeds
+    job_stats['width'] = width
+    job_stats['height'] = height
+    job_stats['peak_memory_mb'] = get_peak_memory_mb()
+    job_stats['peak_memory_scope'] = memory_scope
+    
+    print(f"✓ {len(temp_filenames)} images saved")
+    if job_stats['peak_memory_mb'] is not None:
+        print(f"Peak memory: {job_stats['peak_memory_mb']:.0f} MB ({memory_scope})")
+    return temp_filenames
 
 
 def load_batch_config(config_file):
     """Load batch configuration from JSON file"""
     with open(config_file, 'r') as f:
-        return json.load(f)
+        config = json.load(f)
+    # Names the batch's checkpoint folder, so reruns of the same config find their progress
+    config.setdefault('name', Path(config_file).stem)
+    return config
+
+
+# Optional flags, each taking one value; parsed out before positional arguments
+OPTION_FLAGS = {
+    '--profile': str,
+    '--profile-every': int,
+    '--profile-top': int,
+    '--job-timeout': float,
+    '--batch-timeout': float,
+    '--checkpoint-every': int,
+    '--checkpoint-dir': str,
+    '--adaptive-threshold': float,
+    '--adaptive-min-steps': int,
+    '--adaptive-patience': int,
+    '--calibrate': str,
+    '--calibrate-samplers': str,
+    '--calibrate-schedulers': str,
+    '--calibrate-steps': int,
+    '--status-file': str,
+    '--metrics-file': str,
+    '--status-interval': float,
+}
+
+
+def parse_options(argv):
+    """Split known --options out of argv, returning (positional args, options)"""
+    args, options = [], {}
+    i = 0
+    while i < len(argv):
+        name = argv[i]
+        if name in OPTION_FLAGS and i + 1 < len(argv):
+            options[name[2:].replace('-', '_')] = OPTION_FLAGS[name](argv[i + 1])
+            i += 2
+        else:
+            args.append(name)
+            i += 1
+    return args, options
+
+
+def profile_job(profiler, job_index):
+    """Profiling context for one job (or a pack's job numbers); a no-op when profiling is off"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.profile_job(job_index)
+
+
+def create_controller(options, settings=None):
+    """Build a JobController from --job-timeout/--batch-timeout or config settings"""
+    settings = settings or {}
+    controller = JobController(
+        job_timeout=options.get('job_timeout', settings.get('job_timeout')),
+        batch_timeout=options.get('batch_timeout', settings.get('batch_timeout'))
+    )
+    controller.install_signal_handler()
+    return controller
+
+
+def run_job(controller, job_stats, generate, jobs=1):
+    """Run one generation (one path, or a list for packed jobs) under the controller, recording status and elapsed time"""
+    start = time.perf_counter()
+    controller.start_job(jobs)
+    img_path = None
+    try:
+        img_path = generate()
+        paths = img_path if isinstance(img_path, list) else [img_path]
+        job_stats['status'] = 'ok' if all(path and os.path.exists(path) for path in paths) else 'failed'
+    except JobCancelled as e:
+        job_stats['status'] = e.status
+        job_stats['error'] = str(e)
+        print(f"⏱ Job {e.status}: {e}")
+    except Exception as e:
+        job_stats['status'] = 'failed'
+        job_stats['error'] = str(e)
+        print(f"✗ Generation failed: {str(e)}")
+    job_stats['elapsed_seconds'] = time.perf_counter() - start
+    return img_path if job_stats['status'] == 'ok' else None
+
+
+def split_pack_stats(pack_stats, jobs):
+    """Per-job shares of a pack's timings; the pack totals are kept under pack_* keys"""
+    job_stats = dict(pack_stats)
+    if 'elapsed_seconds' in pack_stats:
+        job_stats['pack_elapsed_seconds'] = pack_stats['elapsed_seconds']
+        job_stats['elapsed_seconds'] = pack_stats['elapsed_seconds'] / jobs
+    if 'stage_seconds' in pack_stats:
+        job_stats['pack_stage_seconds'] = pack_stats['stage_seconds']
+        job_stats['stage_seconds'] = {name: seconds / jobs for name, seconds in pack_stats['stage_seconds'].items()}
+    if 'peak_memory_mb' in pack_stats:
+        # Peak memory is shared by the whole sampler call and cannot be split
+        job_stats['pack_peak_memory_mb'] = job_stats.pop('peak_memory_mb')
+    return job_stats
+
+
+def count_statuses(job_stats_list):
+    """Tally job statuses (ok, failed, timeout, cancelled, skipped) for the summary"""
+    counts = {}
+    for job_stats in job_stats_list:
+        counts[job_stats['status']] = counts.get(job_stats['status'], 0) + 1
+    return counts
+
+
+def create_checkpointer(output_root, options, settings=None, plan_name='single'):
+    """Build a LatentCheckpointer from --checkpoint-every or config settings, or None"""
+    settings = settings or {}
+    every = options.get('checkpoint_every', settings.get('checkpoint_every', 0))
+    if not every:
+        return None
+    # Lives outside the timestamped run folder so a restarted batch finds it;
+    # one folder per plan, so pruning one batch's stale jobs leaves other batches alone
+    checkpoint_dir = Path(options.get('checkpoint_dir', Path(output_root) / '.checkpoints')) / plan_name
+    return LatentCheckpointer(checkpoint_dir, every)
+
+
+def job_checkpoint_key(job_id, prompt, negative_prompt, steps, cfg, width, height, seed=-1):
+    """Stable identity of a planned job, shared by its snapshots and its completion record"""
+    sampler_name, scheduler_name = select_sampler()
+    return LatentCheckpointer.job_key(
+        job=job_id, prompt=prompt, negative_prompt=negative_prompt, seed=seed,
+        steps=steps, cfg=cfg, width=width, height=height,
+        sampler=sampler_name, scheduler=scheduler_name
+    )
+
+
+def reuse_completed(checkpointer, key, job_stats):
+    """Return the image of a job an earlier run of this batch finished, or None"""
+    record = checkpointer.completed(key) if checkpointer else None
+    if not record or not Path(record['image']).exists():
+        return None
+    job_stats.update(record['stats'], reused=True)
+    print(f"✓ Already generated by an earlier run: {record['image']}")
+    return record['image']
+
+
+def finish_checkpoint(checkpointer, key, job_stats, image, controller):
+    """Record a finished job and drop its snapshot, unless the batch budget cut it short"""
+    if not checkpointer:
+        return
+    if job_stats['status'] == 'ok':
+        checkpointer.mark_completed(key, {'image': str(image), 'stats': job_stats})
+    elif controller.batch_expired():
+        return  # keep the snapshot: rerunning the batch continues this job
+    checkpointer.discard(key)
+
+
+def finish_plan(checkpointer, keys, job_stats_list, controller):
+    """Drop completion records once every job ran to a final status; until then a rerun resumes"""
+    if not checkpointer or controller.batch_expired():
+        return
+    if any(job_stats.get('status') in (None, 'skipped') for job_stats in job_stats_list):
+        return
+    checkpointer.finish_plan(keys)
+
+
+def create_monitor(options, settings=None):
+    """Build a per-job ConvergenceMonitor when adaptive steps are enabled, or None"""
+    settings = settings or {}
+    threshold = options.get('adaptive_threshold', settings.get('adaptive_threshold'))
+    if not threshold:
+        return None
+    return ConvergenceMonitor(
+        threshold=threshold,
+        min_steps=options.get('adaptive_min_steps', settings.get('adaptive_min_steps', 8)),
+        patience=options.get('adaptive_patience', settings.get('adaptive_patience', 2))
+    )
+
+
+def create_reporter(output_dir, total_jobs, options, settings=None):
+    """Build and start a ProgressReporter writing <output>/status.json and an optional --metrics-file"""
+    settings = settings or {}
+    reporter = ProgressReporter(
+        total_jobs,
+        status_path=options.get('status_file', settings.get('status_file', Path(output_dir) / 'status.json')),
+        metrics_path=options.get('metrics_file', settings.get('metrics_file')),
+        interval=options.get('status_interval', settings.get('status_interval', 15)),
+        labels=settings.get('metrics_labels')
+    )
+    reporter.start()
+    return reporter
+
+
+def run_calibration(prompt, options):
+    """Run full schedules per sampler/scheduler and report what adaptive stopping would save"""
+    samplers = options.get('calibrate_samplers', 'euler,euler_ancestral,dpmpp_2m,dpmpp_2m_sde_gpu').split(',')
+    schedulers = options.get('calibrate_schedulers', 'karras,normal').split(',')
+    steps = options.get('calibrate_steps', DEVICE_CONFIG["generation_settings"].get("default_steps", 30))
+    min_steps = options.get('adaptive_min_steps', 8)
+    patience = options.get('adaptive_patience', 2)
+    seed = 12345  # Same starting noise for every combination
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = Path("batch_outputs") / f"calibration_{timestamp}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    print("AutoFooocus Batch Generator - Adaptive Steps Calibration")
+    print(f"Prompt: {prompt}")
+    print(f"Samplers: {', '.join(samplers)} | Schedulers: {', '.join(schedulers)} | Steps: {steps}")
+    
+    initialize_fooocus()
+    
+    rows = []
+    for sampler_name in samplers:
+        for scheduler_name in schedulers:
+            print(f"\n=== {sampler_name} / {scheduler_name} ===")
+            monitor = ConvergenceMonitor(threshold=None, keep_predictions=True)
+            try:
+                img_path = generate_image_direct(
+                    prompt=prompt,
+                    negative_prompt="blurry, low quality",
+                    steps=steps,
+                    seed=seed,
+                    sampler_name=sampler_name,
+                    scheduler_name=scheduler_name,
+                    monitor=monitor
+                )
+                src = Path(img_path)
+                src.rename(output_dir / f"{sampler_name}_{scheduler_name}_{src.name}")
+            except Exception as e:
+                print(f"✗ {sampler_name}/{scheduler_name} failed: {str(e)}")
+                continue
+            rows.extend(calibration_rows(monitor, sampler_name, scheduler_name,
+                                         min_steps=min_steps, patience=patience))
+    
+    print("\n=== Adaptive Steps Calibration ===")
+    print(f"{'Sampler':<20} {'Scheduler':<10} {'Threshold':>9} {'Steps':>7} {'Saved (s)':>10} {'Latent err':>10}")
+    for row in rows:
+        print(f"{row['sampler']:<20} {row['scheduler']:<10} {row['threshold']:>9.3f} "
+              f"{row['steps_used']:>3}/{row['steps_total']:<3} {row['seconds_saved']:>10.1f} {row['latent_error']:>10.4f}")
+    
+    with open(output_dir / 'calibration.json', 'w') as f:
+        json.dump({'prompt': prompt, 'seed': seed, 'steps': steps, 'min_steps': min_steps,
+                   'patience': patience, 'results': rows}, f, indent=2)
+    print(f"\n✓ Calibration saved to {output_dir / 'calibration.json'}")
+
+
+def create_profiler(output_dir, options):
+    """Build a JobProfiler from --profile/--profile-every options, or None"""
+    jobs = [int(j) for j in options.get('profile', '').split(',') if j.strip()]
+    every = options.get('profile_every', 0)
+    if not jobs and not every:
+        return None
+    return JobProfiler(output_dir, every=every, jobs=jobs, top_n=options.get('profile_top', 25))
 
 
 def main():
     # Parse arguments
-    if len(original_argv) < 2:
+    argv, options = parse_options(original_argv)
+    if 'calibrate' in options:
+        run_calibration(options['calibrate'], options)
+        return
+    
+    if len(argv) < 2:
         print("Usage:")
-        print("  python working_batch.py \"prompt\" [negative] [steps] [count]")
-        print("  python working_batch.py --config batch_config.json")
+        print("  python working_batch.py \"prompt\" [negative] [steps] [count] [options]")
+        print("  python working_batch.py --config batch_config.json [options]")
+        print("Options:")
+        print("  --profile 1,4        Profile these job numbers (cProfile + torch.profiler)")
+        print("  --profile-every N    Profile every Nth job")
+        print("  --profile-top N      Rows in the top-N operator tables (default: 25)")
+        print("  --job-timeout S      Stop any single job after S seconds (N*S for a pack of N prompts)")
+        print("  --batch-timeout S    Stop starting/continuing jobs after S seconds")
+        print("  (send SIGUSR1 to cancel the current job and continue the batch)")
+        print("  --checkpoint-every K Snapshot sampling every K steps; rerun to resume")
+        print("  --checkpoint-dir D   Checkpoint root; snapshots go to D/<config name>, or D/single (default: <output>/.checkpoints)")
+        print("  --adaptive-threshold T  Stop early once the prediction changes < T per step")
+        print("  --adaptive-min-steps N  Never stop before step N (default: 8)")
+        print("  --adaptive-patience N   Consecutive converged steps required (default: 2)")
+        print("  --calibrate \"prompt\"   Report adaptive-step quality/time tradeoffs per sampler/scheduler")
+        print("  --calibrate-samplers a,b / --calibrate-schedulers x,y / --calibrate-steps N")
+        print("  --status-file F      Progress/ETA JSON (default: <output>/status.json)")
+        print("  --metrics-file F     Prometheus textfile metrics, e.g. for node exporter")
+        print("  --status-interval S  Seconds between status/metrics rewrites (default: 15)")
         print("Examples:")
         print("  python working_batch.py \"mountain landscape\" \"blurry\" 20 2")
         print("  python working_batch.py --config batch_config.json")
+        print("  python working_batch.py --config batch_config.json --profile-every 10")
+        print("  python working_batch.py --config batch_config.json --metrics-file /var/lib/node_exporter/autofooocus.prom")
         return
     
     # Check if using config file
-    if original_argv[1] == "--config" and len(original_argv) > 2:
-        config = load_batch_config(original_argv[2])
-        process_batch_config(config)
+    if argv[1] == "--config" and len(argv) > 2:
+        config = load_batch_config(argv[2])
+        process_batch_config(config, options)
         return
     
     # Single prompt mode
-    prompt = original_argv[1]
-    negative = original_argv[2] if len(original_argv) > 2 else "blurry, low quality"
-    steps = int(original_argv[3]) if len(original_argv) > 3 else 30
-    count = int(original_argv[4]) if len(original_argv) > 4 else 1
+    prompt = argv[1]
+    negative = argv[2] if len(argv) > 2 else "blurry, low quality"
+    steps = int(argv[3]) if len(argv) > 3 else 30
+    count = int(argv[4]) if len(argv) > 4 else 1
     
-    process_single_prompt(prompt, negative, steps, count)
+    process_single_prompt(prompt, negative, steps, count, options)
 
 
-def process_single_prompt(prompt, negative, steps, count):
+def process_single_prompt(prompt, negative, steps, count, options=None):
     """Process a single prompt with specified parameters"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_dir = Path("batch_outputs") / timestamp
@@ -269,44 +852,85 @@ def process_single_prompt(prompt, negative, steps, count):
     print(f"Count: {count}")
     print(f"Output: {output_dir}")
     
+    options = options or {}
+    profiler = create_profiler(output_dir, options)
+    controller = create_controller(options)
+    checkpointer = create_checkpointer("batch_outputs", options)
+    
     initialize_fooocus()
     
     results = []
+    stats = []
+    keys = [None] * count
+    if checkpointer:
+        keys = [job_checkpoint_key(f"single:{i + 1}", prompt, negative, steps, 7.0, 1024, 1024) for i in range(count)]
+        checkpointer.prune(keys)
+    
+    reporter = create_reporter(output_dir, count, options)
+    controller.start_batch()
     for i in range(count):
         print(f"\n=== Image {i+1}/{count} ===")
         
-        try:
-            img_path = generate_image_direct(
-                prompt=prompt,
-                negative_prompt=negative,
-                steps=steps,
-                cfg=7.0,
-                width=1024,
-                height=1024,
-                seed=-1
-            )
-            
-            if img_path and os.path.exists(img_path):
-                src = Path(img_path)
-                dst = output_dir / f"img_{i+1:02d}_{src.name}"
-                src.rename(dst)
-                results.append(str(dst))
-                print(f"Moved to: {dst.name}")
-            
-        except Exception as e:
-            print(f"✗ Generation {i+1} failed: {str(e)}")
+        job_stats = {}
+        stats.append(job_stats)
+        reused = reuse_completed(checkpointer, keys[i], job_stats)
+        if reused:
+            results.append(reused)
+            reporter.jobs_skipped(status='reused')
+            continue
+        if controller.batch_expired():
+            job_stats['status'] = 'skipped'
+            reporter.jobs_skipped()
+            print("⏱ Batch budget exhausted, skipping")
+            continue
+        
+        def generate():
+            with profile_job(profiler, i + 1):
+                return generate_image_direct(
+                    prompt=prompt,
+                    negative_prompt=negative,
+                    steps=steps,
+                    cfg=7.0,
+                    width=1024,
+                    height=1024,
+                    seed=-1,
+                    job_stats=job_stats,
+                    controller=controller,
+                    checkpointer=checkpointer,
+                    checkpoint_key=keys[i],
+                    monitor=create_monitor(options),
+                    reporter=reporter
+                )
+        
+        reporter.job_started(f"image {i + 1}")
+        img_path = run_job(controller, job_stats, generate)
+        reporter.job_finished(job_stats)
+        if img_path:
+            src = Path(img_path)
+            dst = output_dir / f"img_{i+1:02d}_{src.name}"
+            src.rename(dst)
+            results.append(str(dst))
+            job_stats['image'] = str(dst)
+            print(f"Moved to: {dst.name}")
+        finish_checkpoint(checkpointer, keys[i], job_stats, job_stats.get('image'), controller)
+        print(reporter.summary_line())
     
+    reporter.stop()
+    finish_plan(checkpointer, keys, stats, controller)
     save_summary(output_dir, {
         'mode': 'single_prompt',
         'prompt': prompt,
         'negative_prompt': negative,
         'steps': steps,
         'total_images': len(results),
-        'images': results
+        'status_counts': count_statuses(stats),
+        'images': results,
+        'stats': stats,
+        'progress': reporter.status()
     })
 
 
-def process_batch_config(config):
+def process_batch_config(config, options=None):
     """Process batch configuration with multiple prompts and models"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_dir = Path(config['output_dir']) / timestamp
@@ -317,53 +941,153 @@ def process_batch_config(config):
     print(f"Models: {len(config['models']['base'])}")
     print(f"Output: {output_dir}")
     
+    options = options or {}
+    profiler = create_profiler(output_dir, options)
+    controller = create_controller(options, config['settings'])
+    checkpointer = create_checkpointer(config['output_dir'], options, config['settings'], config.get('name', 'batch'))
+    
     initialize_fooocus()
     
     all_results = []
-    total_combinations = len(config['prompts']) * len(config['models']['base'])
-    current = 0
-    
+    all_stats = []
+    jobs = []
     for prompt_config in config['prompts']:
         for base_model in config['models']['base']:
-            current += 1
-            print(f"\n=== Combination {current}/{total_combinations} ===")
-            print(f"Model: {base_model}")
-            print(f"Prompt: {prompt_config['positive'][:50]}...")
+            job_stats = {}
+            all_stats.append(job_stats)
+            result = {
+                'model': base_model,
+                'prompt': prompt_config['positive'],
+                'negative_prompt': prompt_config['negative'],
+                'settings': config['settings'],
+                'stats': job_stats
+            }
+            all_results.append(result)
+            jobs.append({
+                'index': len(jobs) + 1,
+                'model': base_model,
+                'prompt': prompt_config['positive'],
+                'negative_prompt': prompt_config['negative'],
+                'result': result
+            })
+    total_combinations = len(jobs)
+    
+    if checkpointer:
+        for job in jobs:
+            job['key'] = job_checkpoint_key(
+                f"{job['index']}:{job['model']}", job['prompt'], job['negative_prompt'],
+                config['settings']['steps'], config['settings']['cfg_scale'],
+                config['settings']['width'], config['settings']['height']
+            )
+        checkpointer.prune(job['key'] for job in jobs)
+    
+    # Jobs on the same model differ only in prompt and seed, so they can share a sampler call.
+    # Checkpoints snapshot a single job's latent, so checkpointing keeps one job per call.
+    batch_size = config['settings'].get('batch_size', DEVICE_CONFIG['device_settings'].get('batch_size', 1))
+    if checkpointer or not config['settings'].get('prompt_batching', True):
+        batch_size = 1
+    packs = pack_jobs(jobs, batch_size)
+    
+    reporter = create_reporter(output_dir, total_combinations, options, config['settings'])
+    controller.start_batch()
+    for pack in packs:
+        if checkpointer:
+            # Checkpointed batches run one job per pack; skip it if a previous run finished it
+            reused = reuse_completed(checkpointer, pack[0]['key'], pack[0]['result']['stats'])
+            if reused:
+                pack[0]['result']['image'] = reused
+                reporter.jobs_skipped(status='reused')
+                continue
+        
+        if controller.batch_expired():
+            for job in pack:
+                job['result']['stats']['status'] = 'skipped'
+            reporter.jobs_skipped(len(pack))
+            print(f"\n⏱ Batch budget exhausted, skipping {len(pack)} combination(s)")
+            continue
+        
+        if len(pack) == 1:
+            job = pack[0]
+            job_stats = job['result']['stats']
+            print(f"\n=== Combination {job['index']}/{total_combinations} ===")
+            print(f"Model: {job['model']}")
+            print(f"Prompt: {job['prompt'][:50]}...")
             
-            try:
-                img_path = generate_image_direct(
-                    prompt=prompt_config['positive'],
-                    negative_prompt=prompt_config['negative'],
-                    steps=config['settings']['steps'],
-                    cfg=config['settings']['cfg_scale'],
-                    width=config['settings']['width'],
-                    height=config['settings']['height'],
-                    seed=-1
-                )
-                
-                if img_path and os.path.exists(img_path):
-                    src = Path(img_path)
-                    dst = output_dir / f"combo_{current:03d}_{base_model.split('.')[0]}_{src.name}"
-                    src.rename(dst)
-                    
-                    result = {
-                        'image': str(dst),
-                        'model': base_model,
-                        'prompt': prompt_config['positive'],
-                        'negative_prompt': prompt_config['negative'],
-                        'settings': config['settings']
-                    }
-                    all_results.append(result)
-                    print(f"Saved: {dst.name}")
-                
-            except Exception as e:
-                print(f"✗ Combination {current} failed: {str(e)}")
+            def generate():
+                with profile_job(profiler, job['index']):
+                    return generate_image_direct(
+                        prompt=job['prompt'],
+                        negative_prompt=job['negative_prompt'],
+                        steps=config['settings']['steps'],
+                        cfg=config['settings']['cfg_scale'],
+                        width=config['settings']['width'],
+                        height=config['settings']['height'],
+                        seed=-1,
+                        settings=config['settings'],
+                        job_stats=job_stats,
+                        controller=controller,
+                        checkpointer=checkpointer,
+                        checkpoint_key=job.get('key'),
+                        monitor=create_monitor(options, config['settings']),
+                        reporter=reporter
+                    )
+            
+            reporter.job_started(f"combination {job['index']}: {job['model']}")
+            img_paths = [run_job(controller, job_stats, generate)]
+            reporter.job_finished(job_stats)
+        else:
+            indices = [job['index'] for job in pack]
+            print(f"\n=== Combinations {', '.join(map(str, indices))} of {total_combinations} (packed) ===")
+            print(f"Model: {pack[0]['model']}")
+            
+            pack_stats = {}
+            
+            def generate():
+                with profile_job(profiler, indices):
+                    return generate_images_packed(
+                        pack,
+                        steps=config['settings']['steps'],
+                        cfg=config['settings']['cfg_scale'],
+                        width=config['settings']['width'],
+                        height=config['settings']['height'],
+                        settings=config['settings'],
+                        job_stats=pack_stats,
+                        controller=controller,
+                        monitor=create_monitor(options, config['settings']),
+                        reporter=reporter
+                    )
+            
+            reporter.job_started(f"combinations {', '.join(map(str, indices))}: {pack[0]['model']}", jobs=len(pack))
+            img_paths = run_job(controller, pack_stats, generate, jobs=len(pack)) or [None] * len(pack)
+            reporter.job_finished(pack_stats, jobs=len(pack))
+            seeds = pack_stats.pop('seeds', [None] * len(pack))
+            shares = split_pack_stats(pack_stats, len(pack))
+            for job, seed in zip(pack, seeds):
+                job['result']['stats'].update(shares, seed=seed, packed_with=indices)
+        
+        for job, img_path in zip(pack, img_paths):
+            if img_path:
+                src = Path(img_path)
+                dst = output_dir / f"combo_{job['index']:03d}_{job['model'].split('.')[0]}_{src.name}"
+                src.rename(dst)
+                job['result']['image'] = str(dst)
+                print(f"Saved: {dst.name}")
+        if checkpointer:
+            job = pack[0]
+            finish_checkpoint(checkpointer, job['key'], job['result']['stats'], job['result'].get('image'), controller)
+        print(reporter.summary_line())
     
+    reporter.stop()
+    if checkpointer:
+        finish_plan(checkpointer, [job['key'] for job in jobs], all_stats, controller)
+    status_counts = count_statuses(all_stats)
     save_summary(output_dir, {
         'mode': 'batch_config',
         'config': config,
-        'total_images': len(all_results),
-        'results': all_results
+        'total_images': status_counts.get('ok', 0),
+        'status_counts': status_counts,
+        'results': all_results,
+        'progress': reporter.status()
     })
 
 
@@ -375,6 +1099,9 @@ def save_summary(output_dir, data):
         json.dump(data, f, indent=2)
     
     print(f"\n✓ Generated {data['total_images']} images in {output_dir}")
+    problems = {k: v for k, v in data.get('status_counts', {}).items() if k != 'ok'}
+    if problems:
+        print("  " + ", ".join(f"{count} {status}" for status, count in sorted(problems.items())))
 
 
 if __name__ == '__main__':